@@ -1,135 +1,192 @@
-import json
+import asyncio
+import logging
 import re
-from typing import Dict, Optional
-from groq import Groq
+import orjson
+from typing import Dict, List, Optional
+from groq import AsyncGroq
+from pydantic import BaseModel, Field, ValidationError
 from decimal import Decimal
 from dotenv import load_dotenv
 import os
+from llm_cache import ResponseCache, make_cache_key
+from json_stream import IncrementalJsonParser
 
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
+logger = logging.getLogger(__name__)
 
-def calculate_credit_score(financial_data, groq_client):
+CREDIT_SCORE_CACHE = ResponseCache("credit")
+
+# The full schema with 2-4 item lists fits in ~650 output tokens
+_CREDIT_MAX_TOKENS = 900
+
+# Response models; defaults fill in whatever the model leaves out
+class FactorBreakdown(BaseModel):
+    actual_value: float = 0.0
+    individual_score: float = 0.0
+    weighted_score: float = 0.0
+    weight_percentage: int = 0
+    comment: str = "N/A"
+
+class CreditFactors(BaseModel):
+    payment_completion_rate: FactorBreakdown = Field(default_factory=FactorBreakdown)
+    paid_to_pending_ratio: FactorBreakdown = Field(default_factory=FactorBreakdown)
+    tax_compliance: FactorBreakdown = Field(default_factory=FactorBreakdown)
+    extra_charges_management: FactorBreakdown = Field(default_factory=FactorBreakdown)
+
+class DetailedAnalysis(BaseModel):
+    strengths: List[str] = []
+    weaknesses: List[str] = []
+    risk_assessment: str = "Unknown"
+    creditworthiness_summary: List[str] = []
+
+class Recommendations(BaseModel):
+    immediate_actions: List[str] = []
+    long_term_improvements: List[str] = []
+    priority_focus_areas: List[str] = []
+
+class CreditScoreAnalysis(BaseModel):
+    final_weighted_credit_score: float = 0.0
+    score_category: str = "Unknown"
+    factor_breakdown: CreditFactors = Field(default_factory=CreditFactors)
+    detailed_analysis: DetailedAnalysis = Field(default_factory=DetailedAnalysis)
+    recommendations: Recommendations = Field(default_factory=Recommendations)
+
+
+_JSON_FENCE_RE = re.compile(r"```json\s*(\{[\s\S]*?\})\s*```", re.IGNORECASE)
+_JSON_OBJ_RE = re.compile(r"\{[\s\S]*\}")
+_TRAILING_COMMA_RE = re.compile(r",(\s*[}\]])")
+
+# Everything except the input data is static, so the whole system message
+# forms a prompt prefix that is identical across requests
+_CREDIT_SYSTEM_PROMPT = """You are a financial credit analysis expert. Compute a weighted CIBIL-style credit score (0-100) for the user's data.
+
+Weights: payment_completion_rate (PCR) 40, paid_to_pending_ratio (PPR) 30, tax_compliance 15, extra_charges_management 15.
+Scores (E=90-100,G=70-89,F=50-69,P=0-49):
+PCR: 90%+=E,70%+=G,50%+=F,<50%=P
+PPR: >4=E,2-4=G,1-2=F,<1=P
+Tax, extra charges: lower % of total = higher score.
+
+Keep calculations exact and comments actionable. creditworthiness_summary: 2-4 analytical sentences on cash flow, pending dues, cost optimization and overall health.
+
+Reply with ONLY this JSON, no other text:
+{"final_weighted_credit_score":number 0-100,"score_category":"Excellent|Good|Fair|Poor",
+"factor_breakdown":{"payment_completion_rate":F,"paid_to_pending_ratio":F,"tax_compliance":F,"extra_charges_management":F},
+"detailed_analysis":{"strengths":[str],"weaknesses":[str],"risk_assessment":"Low|Medium|High risk","creditworthiness_summary":[str]},
+"recommendations":{"immediate_actions":[str],"long_term_improvements":[str],"priority_focus_areas":[str]}}
+where F = {"actual_value":number,"individual_score":number 0-100,"weighted_score":number,"weight_percentage":int,"comment":str}.
+tax_compliance/extra_charges_management actual_value = percentage of total_amount."""
+
+_CREDIT_PROMPT_HEAD = "Input data:\n"
+
+
+def _build_credit_messages(financial_data):
+    """Build the chat messages for a credit score request."""
+    prompt = _CREDIT_PROMPT_HEAD + orjson.dumps(financial_data).decode()
+    return [
+        {
+            "role": "system",
+            "content": _CREDIT_SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
+
+
+async def calculate_credit_score(financial_data, groq_client):
     """
     Calculate weighted credit score using Groq API
     
     Args:
         financial_data (dict): Financial metrics data
-        groq_client: Groq client instance
+        groq_client: AsyncGroq client instance
     
     Returns:
         dict: Credit score analysis with breakdown
     """
     
-    prompt = f"""You are a financial credit analysis expert. Based on the provided financial data, calculate a weighted CIBIL-style credit score from 0 to 100.
-
-Use these weightings for calculation:
-- Payment Completion Rate: 40% weight (most important)
-- Paid-to-Pending Ratio: 30% weight (second most important)
-- Tax Compliance: 15% weight (moderate importance)
-- Extra Charges Management: 15% weight (moderate importance)
-
-Input Data:
-{json.dumps(financial_data, indent=2)}
-
-Scoring Guidelines:
-- Payment Completion Rate: 90-100% = Excellent (90-100 points), 70-89% = Good (70-89 points), 50-69% = Fair (50-69 points), <50% = Poor (0-49 points)
-- Paid-to-Pending Ratio: >4.0 = Excellent (90-100 points), 2.0-4.0 = Good (70-89 points), 1.0-2.0 = Fair (50-69 points), <1.0 = Poor (0-49 points)
-- Tax Compliance: Lower tax percentage of total = Better score
-- Extra Charges Management: Lower extra charges percentage = Better score
-
-Return the analysis in this exact JSON structure. Your final response should contain only this json and nothing else, no extra text or anything apart from this json data:
-{{
-    "final_weighted_credit_score": "number (0-100)",
-    "score_category": "string (Excellent/Good/Fair/Poor)",
-    "factor_breakdown": {{
-        "payment_completion_rate": {{
-            "actual_value": "number",
-            "individual_score": "number (0-100)",
-            "weighted_score": "number",
-            "weight_percentage": 40,
-            "comment": "string"
-        }},
-        "paid_to_pending_ratio": {{
-            "actual_value": "number",
-            "individual_score": "number (0-100)",
-            "weighted_score": "number",
-            "weight_percentage": 30,
-            "comment": "string"
-        }},
-        "tax_compliance": {{
-            "actual_value": "number (tax percentage of total)",
-            "individual_score": "number (0-100)",
-            "weighted_score": "number",
-            "weight_percentage": 15,
-            "comment": "string"
-        }},
-        "extra_charges_management": {{
-            "actual_value": "number (extra charges percentage of total)",
-            "individual_score": "number (0-100)",
-            "weighted_score": "number",
-            "weight_percentage": 15,
-            "comment": "string"
-        }}
-    }},
-    "detailed_analysis": {{
-        "strengths": ["string array of positive aspects"],
-        "weaknesses": ["string array of areas needing improvement"],
-        "risk_assessment": "string (Low/Medium/High risk)",
-        "creditworthiness_summary": ["array of detailed analysis statements"]
-    }},
-    "recommendations": {{
-        "immediate_actions": ["string array"],
-        "long_term_improvements": ["string array"],
-        "priority_focus_areas": ["string array"]
-    }}
-}}
-
-Ensure all calculations are mathematically accurate and provide insightful, actionable comments.
-
-For the creditworthiness_summary, provide 2-4 detailed analytical statements as an array, covering:
-- Cash flow stability and payment patterns
-- Revenue utilization efficiency and pending amount management
-- Cost optimization opportunities (tax compliance and extra charges)
-- Overall financial health assessment
-
-Example creditworthiness_summary format:
-[
-  "Cash inflow appears stable enough to cover 80% of monthly invoices, but pending amounts remain significant.",
-  "The low paid-to-pending ratio suggests that either payments are being delayed or incoming revenue is not being efficiently used to clear outstanding dues.",
-  "Extra charges, while moderate, could be optimized by improving operational efficiency and avoiding late fees or penalties."
-]"""
+    # Identical financial data always yields the same analysis
+    cache_key = make_cache_key(financial_data)
+    cached_analysis = await CREDIT_SCORE_CACHE.aget(cache_key)
+    if cached_analysis is not None:
+        return cached_analysis
     
     try:
         # Create chat completion
-        chat_completion = groq_client.chat.completions.create(
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
+        chat_completion = await groq_client.chat.completions.create(
+            messages=_build_credit_messages(financial_data),
             model="meta-llama/llama-4-scout-17b-16e-instruct",
             temperature=0.1,
-            max_tokens=1500
+            max_tokens=_CREDIT_MAX_TOKENS,
+            response_format={"type": "json_object"}
         )
         
         # Extract response content
         response_text = chat_completion.choices[0].message.content
-
-        print(response_text)
         
         # Parse credit score analysis
         credit_analysis = parse_credit_score_response(response_text)
+        if credit_analysis:
+            await CREDIT_SCORE_CACHE.aset(cache_key, credit_analysis)
         
         return credit_analysis
         
     except Exception as e:
-        print(f"❌ Error calculating credit score with Groq API: {str(e)}")
+        logger.error("❌ Error calculating credit score with Groq API: %s", e)
         return {}
 
 
+async def stream_credit_score(financial_data, groq_client):
+    """
+    Stream a credit score analysis from the Groq API
+    
+    Args:
+        financial_data (dict): Financial metrics data
+        groq_client: AsyncGroq client instance
+    
+    Yields:
+        tuple: (field_name, value) for each top-level field as soon as the
+        model finishes it, then ("credit_score_analysis", validated analysis)
+    """
+    
+    cache_key = make_cache_key(financial_data)
+    cached_analysis = await CREDIT_SCORE_CACHE.aget(cache_key)
+    if cached_analysis is not None:
+        yield "credit_score_analysis", cached_analysis
+        return
+    
+    parser = IncrementalJsonParser()
+    try:
+        stream = await groq_client.chat.completions.create(
+            messages=_build_credit_messages(financial_data),
+            model="meta-llama/llama-4-scout-17b-16e-instruct",
+            temperature=0.1,
+            max_tokens=_CREDIT_MAX_TOKENS,
+            stream=True
+        )
+        
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                for field in parser.feed(delta):
+                    yield field
+        
+    except Exception as e:
+        logger.error("❌ Error streaming credit score with Groq API: %s", e)
+        yield "credit_score_analysis", {}
+        return
+    
+    # The assembled text goes through the same validation as the non-streaming path
+    credit_analysis = parse_credit_score_response(parser.text)
+    if credit_analysis:
+        await CREDIT_SCORE_CACHE.aset(cache_key, credit_analysis)
+    
+    yield "credit_score_analysis", credit_analysis
+
+
 def parse_credit_score_response(text):
     """
     Parse credit score analysis from JSON text or dict.
@@ -144,25 +201,36 @@ def parse_credit_score_response(text):
     if isinstance(text, dict):
         return validate_credit_response(text)
     
-    # Try to extract JSON block if it's inside ```json ... ```
-    json_match = re.search(r"```json\s*(\{[\s\S]*?\})\s*```", text, re.IGNORECASE)
-    if json_match:
-        text = json_match.group(1)
-    else:
-        # Try to find any JSON object in the text
-        match = re.search(r"\{[\s\S]*\}", text)
-        if match:
-            text = match.group(0)
-
-    # Remove trailing commas before } or ]
-    text = re.sub(r",(\s*[}\]])", r"\1", text)
+    # Fast path: the prompt asks for bare JSON, so most responses parse as-is
+    credit_data = None
+    stripped = text.strip()
+    if stripped.startswith("{") and stripped.endswith("}"):
+        try:
+            credit_data = orjson.loads(stripped)
+        except orjson.JSONDecodeError:
+            pass
+    
+    if credit_data is None:
+        # Try to extract JSON block if it's inside ```json ... ```
+        json_match = _JSON_FENCE_RE.search(text)
+        if json_match:
+            text = json_match.group(1)
+        else:
+            # Try to find any JSON object in the text
+            match = _JSON_OBJ_RE.search(text)
+            if match:
+                text = match.group(0)
+
+        # Remove trailing commas before } or ]
+        text = _TRAILING_COMMA_RE.sub(r"\1", text)
 
     # Try parsing cleaned text
     try:
-        credit_data = json.loads(text)
+        if credit_data is None:
+            credit_data = orjson.loads(text)
         return validate_credit_response(credit_data)
     except Exception as e:
-        print(f"❌ JSON parse failed for credit score: {e}")
+        logger.error("❌ JSON parse failed for credit score: %s", e)
         return {}
 
 
@@ -173,39 +241,28 @@ def validate_credit_response(data):
     if not isinstance(data, dict):
         return {}
     
-    # Ensure required structure with defaults
-    validated_response = {
-        "final_weighted_credit_score": float(data.get("final_weighted_credit_score", 0)),
-        "score_category": data.get("score_category", "Unknown"),
-        "factor_breakdown": {},
-        "detailed_analysis": {
-            "strengths": data.get("detailed_analysis", {}).get("strengths", []),
-            "weaknesses": data.get("detailed_analysis", {}).get("weaknesses", []),
-            "risk_assessment": data.get("detailed_analysis", {}).get("risk_assessment", "Unknown"),
-            "creditworthiness_summary": data.get("detailed_analysis", {}).get("creditworthiness_summary", [])
-        },
-        "recommendations": {
-            "immediate_actions": data.get("recommendations", {}).get("immediate_actions", []),
-            "long_term_improvements": data.get("recommendations", {}).get("long_term_improvements", []),
-            "priority_focus_areas": data.get("recommendations", {}).get("priority_focus_areas", [])
-        }
-    }
-    
-    # Validate factor breakdown
-    factor_breakdown = data.get("factor_breakdown", {})
-    factors = ["payment_completion_rate", "paid_to_pending_ratio", "tax_compliance", "extra_charges_management"]
-    
-    for factor in factors:
-        factor_data = factor_breakdown.get(factor, {})
-        validated_response["factor_breakdown"][factor] = {
-            "actual_value": float(factor_data.get("actual_value", 0)),
-            "individual_score": float(factor_data.get("individual_score", 0)),
-            "weighted_score": float(factor_data.get("weighted_score", 0)),
-            "weight_percentage": int(factor_data.get("weight_percentage", 0)),
-            "comment": factor_data.get("comment", "N/A")
-        }
+    try:
+        return CreditScoreAnalysis.model_validate(data).model_dump()
+    except ValidationError as e:
+        logger.error("❌ Credit score response failed validation: %s", e)
+        return {}
+
+
+def structure_credit_score(credit_analysis):
+    """
+    Wrap credit analysis in the API response structure
     
-    return validated_response
+    Args:
+        credit_analysis (dict): Credit score analysis details
+
+    Returns:
+        dict: Response payload
+    """
+    return {
+        "credit_score_analysis": credit_analysis,
+        "timestamp": "generated",
+        "api_model": "meta-llama/llama-4-scout-17b-16e-instruct"
+    }
 
 
 def structure_credit_score_json(credit_analysis):
@@ -218,34 +275,32 @@ def structure_credit_score_json(credit_analysis):
     Returns:
         str: JSON-formatted string
     """
-    return json.dumps({
-        "credit_score_analysis": credit_analysis,
-        "timestamp": "generated",
-        "api_model": "meta-llama/llama-4-scout-17b-16e-instruct"
-    }, indent=2, ensure_ascii=False)
+    return orjson.dumps(structure_credit_score(credit_analysis), option=orjson.OPT_INDENT_2).decode()
 
 
-def main(financial_data, groq_api_key):
+def main(financial_data, groq_api_key, groq_client=None):
     """
     Main function to calculate credit score
     
     Args:
         financial_data (dict): Financial metrics for credit scoring
         groq_api_key (str): Groq API key
+        groq_client: Shared AsyncGroq client; a new one is created if omitted
         
     Returns:
         str: JSON formatted credit score analysis
     """
     
     # Initialize Groq client
-    try:
-        groq_client = Groq(api_key=groq_api_key)
-    except Exception as e:
-        print(f"❌ Error initializing Groq client: {str(e)}")
-        return {}
+    if groq_client is None:
+        try:
+            groq_client = AsyncGroq(api_key=groq_api_key)
+        except Exception as e:
+            print(f"❌ Error initializing Groq client: {str(e)}")
+            return {}
     
     # Calculate credit score
-    credit_analysis = calculate_credit_score(financial_data, groq_client)
+    credit_analysis = asyncio.run(calculate_credit_score(financial_data, groq_client))
     formatted_analysis = structure_credit_score_json(credit_analysis)
     
     return formatted_analysis
@@ -1,26 +1,33 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-import json
+import orjson
+import logging
 from typing import List, Dict, Optional
-from credit_score import main as calculate_credit_score_main
+from credit_score import CreditScoreAnalysis, calculate_credit_score, stream_credit_score, structure_credit_score
 from dotenv import load_dotenv
+from groq import AsyncGroq
+from groq_http import shared_async_http_client
 import os
 
 # Load environment variables from .env file
 load_dotenv()
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
 
-# Allow CORS for all origins (you can restrict in production)
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# One client per process so connections to the Groq API are reused across requests
+GROQ_CLIENT = AsyncGroq(api_key=GROQ_API_KEY, http_client=shared_async_http_client()) if GROQ_API_KEY else None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    if GROQ_CLIENT is not None:
+        await GROQ_CLIENT.close()
+
+router = APIRouter(default_response_class=ORJSONResponse)
 
 class FinancialData(BaseModel):
     no_of_invoices: int = Field(..., ge=1, description="Number of invoices (must be >= 1)")
@@ -32,37 +39,28 @@ class FinancialData(BaseModel):
     payment_completion_rate: float = Field(..., ge=0, le=1, description="Payment completion rate (0-1)")
     paid_to_pending_ratio: float = Field(..., ge=0, description="Paid to pending ratio")
 
-class FactorBreakdown(BaseModel):
-    actual_value: float
-    individual_score: float
-    weighted_score: float
-    weight_percentage: int
-    comment: str
-
-class DetailedAnalysis(BaseModel):
-    strengths: List[str]
-    weaknesses: List[str]
-    risk_assessment: str
-    creditworthiness_summary: List[str]
-
-class Recommendations(BaseModel):
-    immediate_actions: List[str]
-    long_term_improvements: List[str]
-    priority_focus_areas: List[str]
-
-class CreditScoreAnalysis(BaseModel):
-    final_weighted_credit_score: float
-    score_category: str
-    factor_breakdown: Dict[str, FactorBreakdown]
-    detailed_analysis: DetailedAnalysis
-    recommendations: Recommendations
-
 class CreditScoreResponse(BaseModel):
     credit_score_analysis: CreditScoreAnalysis
     timestamp: str
     api_model: str
 
-@app.post("/calculate-credit-score", response_model=CreditScoreResponse)
+def validate_financial_totals(financial_dict: dict):
+    """Reject data whose paid and pending amounts don't add up to the total."""
+    # Compare in integer cents so the check doesn't depend on float rounding
+    total_cents = round(financial_dict["total_amount"] * 100)
+    pending_cents = round(financial_dict["total_amount_pending"] * 100)
+    paid_cents = round(financial_dict["total_amount_paid"] * 100)
+    if pending_cents + paid_cents != total_cents:
+        raise HTTPException(
+            status_code=400, 
+            detail="Total amount should equal sum of pending and paid amounts"
+        )
+
+def sse_event(event: str, data) -> bytes:
+    """Encode one server-sent event with a JSON payload."""
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+@router.post("/calculate-credit-score", responses={200: {"model": CreditScoreResponse}})
 async def calculate_credit_score_api(financial_data: FinancialData):
     """
     Calculate weighted credit score based on financial metrics.
@@ -71,70 +69,114 @@ async def calculate_credit_score_api(financial_data: FinancialData):
     with weighted factors, detailed breakdown, and recommendations.
     """
     
-    GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-    if not GROQ_API_KEY:
+    if GROQ_CLIENT is None:
         raise HTTPException(status_code=500, detail="GROQ_API_KEY not set in environment.")
     
+    # Convert Pydantic model to dict
+    financial_dict = financial_data.model_dump()
+    
+    # Validate business logic; outside the try so a bad total stays a 400
+    validate_financial_totals(financial_dict)
+    
     try:
-        # Convert Pydantic model to dict
-        financial_dict = financial_data.model_dump()
-        
-        # Validate business logic
-        if abs(financial_dict["total_amount_pending"] + financial_dict["total_amount_paid"] - financial_dict["total_amount"]) > 0.01:
-            raise HTTPException(
-                status_code=400, 
-                detail="Total amount should equal sum of pending and paid amounts"
-            )
+        logger.debug("Starting credit score calculation...")
+        credit_analysis = await calculate_credit_score(financial_dict, GROQ_CLIENT)
+        if not credit_analysis:
+            raise ValueError("No credit score analysis returned")
+        result_dict = structure_credit_score(credit_analysis)
+        logger.debug("Credit score calculation result: %s", result_dict)
         
-        print("Starting credit score calculation...")
-        result_json = calculate_credit_score_main(financial_dict, GROQ_API_KEY)
-        print(f"Credit score calculation result: {result_json}")
+        # validate_credit_response already filled every field, so skip re-validation
+        return ORJSONResponse(result_dict)
         
-        # Parse the JSON string result
-        result_dict = json.loads(result_json)
-        
-        return CreditScoreResponse(**result_dict)
-        
-    except json.JSONDecodeError as e:
-        raise HTTPException(status_code=500, detail=f"Failed to parse credit score response: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Credit score calculation failed: {str(e)}")
 
-@app.get("/")
-def root():
-    return {
-        "message": "Credit Score Analysis API. Submit financial data to get weighted credit score analysis.",
-        "endpoints": {
-            "calculate_credit_score": {
-                "path": "/calculate-credit-score",
-                "method": "POST",
-                "description": "Calculate weighted credit score from financial metrics",
-                "request": {
-                    "no_of_invoices": "integer (>= 1)",
-                    "total_amount": "number (>= 0)",
-                    "total_amount_pending": "number (>= 0)",
-                    "total_amount_paid": "number (>= 0)",
-                    "tax": "number (>= 0)",
-                    "extra_charges": "number (>= 0)",
-                    "payment_completion_rate": "number (0-1)",
-                    "paid_to_pending_ratio": "number (>= 0)"
-                },
-                "response": {
-                    "credit_score_analysis": {
-                        "final_weighted_credit_score": "number (0-100)",
-                        "score_category": "string",
-                        "factor_breakdown": {
-                            "payment_completion_rate": "object",
-                            "paid_to_pending_ratio": "object",
-                            "tax_compliance": "object",
-                            "extra_charges_management": "object"
-                        },
-                        "detailed_analysis": "object",
-                        "recommendations": "object"
+@router.post("/calculate-credit-score/stream")
+async def stream_credit_score_api(financial_data: FinancialData):
+    """
+    Stream a credit score analysis as server-sent events.
+    
+    Each top-level field is sent as a `field` event as soon as the model
+    finishes it; the last event is the validated `credit_score_analysis`.
+    """
+    
+    if GROQ_CLIENT is None:
+        raise HTTPException(status_code=500, detail="GROQ_API_KEY not set in environment.")
+    
+    financial_dict = financial_data.model_dump()
+    validate_financial_totals(financial_dict)
+    
+    async def events():
+        # Field names come from the model, so they go in the data rather than
+        # the SSE event name, where a newline could inject extra SSE lines
+        async for field, value in stream_credit_score(financial_dict, GROQ_CLIENT):
+            if field == "credit_score_analysis":
+                yield sse_event(field, value)
+            else:
+                yield sse_event("field", {"field": field, "value": value})
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+# The service description never changes, so it is encoded once at import
+_ROOT_BYTES = orjson.dumps({
+    "message": "Credit Score Analysis API. Submit financial data to get weighted credit score analysis.",
+    "endpoints": {
+        "calculate_credit_score": {
+            "path": "/calculate-credit-score",
+            "method": "POST",
+            "description": "Calculate weighted credit score from financial metrics",
+            "request": {
+                "no_of_invoices": "integer (>= 1)",
+                "total_amount": "number (>= 0)",
+                "total_amount_pending": "number (>= 0)",
+                "total_amount_paid": "number (>= 0)",
+                "tax": "number (>= 0)",
+                "extra_charges": "number (>= 0)",
+                "payment_completion_rate": "number (0-1)",
+                "paid_to_pending_ratio": "number (>= 0)"
+            },
+            "response": {
+                "credit_score_analysis": {
+                    "final_weighted_credit_score": "number (0-100)",
+                    "score_category": "string",
+                    "factor_breakdown": {
+                        "payment_completion_rate": "object",
+                        "paid_to_pending_ratio": "object",
+                        "tax_compliance": "object",
+                        "extra_charges_management": "object"
                     },
-                    "timestamp": "string",
-                    "api_model": "string"
-                }
+                    "detailed_analysis": "object",
+                    "recommendations": "object"
+                },
+                "timestamp": "string",
+                "api_model": "string"
             }
+        },
+        "stream_credit_score": {
+            "path": "/calculate-credit-score/stream",
+            "method": "POST",
+            "description": "Same as calculate_credit_score, streamed as server-sent events per top-level field",
+            "request": "same as calculate_credit_score",
+            "response": "text/event-stream; field events ({field, value}), then credit_score_analysis"
         }
     }
+})
+
+@router.get("/")
+async def root():
+    return Response(_ROOT_BYTES, media_type="application/json")
+
+# Standalone app for running this service on its own; server.py includes the router instead
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+
+# Allow CORS for all origins (you can restrict in production)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+app.include_router(router)
@@ -0,0 +1,34 @@
+"""
+Process-wide HTTP/2 connection pool for AsyncGroq clients.
+
+Every service mounted on the gateway talks to the same Groq host, so
+their clients share one pool: warm TLS connections are reused across
+services and concurrent calls are multiplexed over HTTP/2 instead of
+each client opening its own connections.
+"""
+
+import httpx
+from groq import DefaultAsyncHttpxClient
+
+_HTTP_LIMITS = httpx.Limits(max_connections=200, max_keepalive_connections=100, keepalive_expiry=60.0)
+
+_HTTP_CLIENT = None
+
+
+def create_async_http_client() -> httpx.AsyncClient:
+    """Create a private HTTP/2 client with the shared pool's settings; the caller closes it."""
+    # Keeps the Groq SDK's default timeout and redirect handling
+    return DefaultAsyncHttpxClient(http2=True, limits=_HTTP_LIMITS)
+
+
+def shared_async_http_client() -> httpx.AsyncClient:
+    """
+    Return the shared httpx client, creating it on first use or after it was closed.
+
+    Clients built on it must not be closed before process shutdown, since
+    every module-level Groq client holds the same pool.
+    """
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is None or _HTTP_CLIENT.is_closed:
+        _HTTP_CLIENT = create_async_http_client()
+    return _HTTP_CLIENT
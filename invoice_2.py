@@ -1,54 +1,49 @@
-import json
-import base64
+import asyncio
+import logging
 import re
+import orjson
 from typing import List, Dict, Optional
-from groq import Groq
-from decimal import Decimal
+from groq import AsyncGroq
 from dotenv import load_dotenv
 import os
+from llm_cache import ResponseCache, make_cache_key
+from json_stream import IncrementalJsonParser
+
+# SIMD-accelerated base64 when available; same API as the stdlib module
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
 
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
+logger = logging.getLogger(__name__)
 
-# In[12]:
+INVOICE_CACHE = ResponseCache("invoice")
 
+# Header fields plus ~20 line items fit in ~400 output tokens
+_INVOICE_MAX_TOKENS = 500
 
-def encode_image_to_base64(image_path):
-    """
-    Encode image to base64 for API transmission
-    
-    Args:
-        image_path (str): Path to prescription image
-        
-    Returns:
-        str: Base64 encoded image
-    """
-    try:
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
-    except Exception as e:
-        print(f"Error encoding image: {str(e)}")
-        return None
+_JSON_OBJ_RE = re.compile(r"\{[\s\S]*\}")
+_TRAILING_COMMA_RE = re.compile(r",(\s*[}\]])")
 
-def extract_invoice_details(image_path, groq_client):
-    """
-    Extract dosage and instructions from prescription
-    
-    Args:
-        image_path (str): Path to prescription image
-        groq_client: Groq client instance
-    
-    Returns:
-        dict: Medicine dosage details
-    """
-    
-    # Encode image to base64
-    base64_image = encode_image_to_base64(image_path)
-    if not base64_image:
-        return {}
-    
-    prompt =  """You are an invoice analysis expert. Extract key information from this invoice image and return it in JSON format.
+
+def _to_amount(value):
+    """Round a currency amount from the model output to 2 decimal places."""
+    return round(float(value or 0), 2)
+
+
+def _to_text(value, default):
+    """Return a text field from the model output as a string, or `default` if it is null or empty."""
+    if value is None or value == "":
+        return default
+    return str(value)
+
+
+# Instructions and schema are static, so they go in the system message and
+# form a prompt prefix that is identical across requests
+_INVOICE_SYSTEM_PROMPT = """You are an invoice analysis expert. Extract key information from this invoice image and return it in JSON format.
     
     Extract the following information:
     - Invoice number
@@ -82,32 +77,87 @@ def extract_invoice_details(image_path, groq_client):
     }
     
     If any field is not clearly visible, use "N/A" or 0.0 for amounts.
-t: Parsed invoice data.
     """
+
+
+def _build_invoice_messages(base64_image):
+    """Build the chat messages for an invoice extraction request."""
+    return [
+        {
+            "role": "system",
+            "content": _INVOICE_SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "text",
+                    "text": "Extract the details of this invoice."
+                },
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:image/jpeg;base64,{base64_image}"
+                    }
+                }
+            ]
+        }
+    ]
+
+
+# In[12]:
+
+
+def encode_image_to_base64(image_bytes):
+    """
+    Encode image to base64 for API transmission
+    
+    Args:
+        image_bytes (bytes): Raw invoice image
+        
+    Returns:
+        str: Base64 encoded image
+    """
+    try:
+        return base64.b64encode(image_bytes).decode('ascii')
+    except Exception as e:
+        logger.error("Error encoding image: %s", e)
+        return None
+
+async def extract_invoice_details(image_bytes, groq_client):
+    """
+    Extract dosage and instructions from prescription
+    
+    Args:
+        image_bytes (bytes): Raw invoice image
+        groq_client: AsyncGroq client instance
+    
+    Returns:
+        dict: Medicine dosage details
+    """
+    
+    if not image_bytes:
+        return {}
+    
+    # Same image always yields the same extraction
+    cache_key = make_cache_key(image_bytes)
+    cached_details = await INVOICE_CACHE.aget(cache_key)
+    if cached_details is not None:
+        return cached_details
+    
+    # Encode image to base64
+    base64_image = encode_image_to_base64(image_bytes)
+    if not base64_image:
+        return {}
     
     try:
         # Create chat completion with image
-        chat_completion = groq_client.chat.completions.create(
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": prompt
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
-                            }
-                        }
-                    ]
-                }
-            ],
+        chat_completion = await groq_client.chat.completions.create(
+            messages=_build_invoice_messages(base64_image),
             model="meta-llama/llama-4-scout-17b-16e-instruct",
             temperature=0.1,
-            max_tokens=800
+            max_tokens=_INVOICE_MAX_TOKENS,
+            response_format={"type": "json_object"}
         )
         
         # Extract response content
@@ -115,21 +165,79 @@ t: Parsed invoice data.
         
         # Parse dosage details
         invoice_details = parse_invoice_information(response_text)
+        if invoice_details:
+            await INVOICE_CACHE.aset(cache_key, invoice_details)
         
         return invoice_details
         
     except Exception as e:
-        print(f"❌ Error extracting details with Groq API: {str(e)}")
+        logger.error("❌ Error extracting details with Groq API: %s", e)
         return {}
 
 
+async def stream_invoice_details(image_bytes, groq_client):
+    """
+    Stream invoice extraction from the Groq API
+    
+    Args:
+        image_bytes (bytes): Raw invoice image
+        groq_client: AsyncGroq client instance
+    
+    Yields:
+        tuple: (field_name, value) for each top-level field as soon as the
+        model finishes it, then ("invoice_details", parsed invoice details)
+    """
+    
+    if not image_bytes:
+        yield "invoice_details", {}
+        return
+    
+    cache_key = make_cache_key(image_bytes)
+    cached_details = await INVOICE_CACHE.aget(cache_key)
+    if cached_details is not None:
+        yield "invoice_details", cached_details
+        return
+    
+    base64_image = encode_image_to_base64(image_bytes)
+    if not base64_image:
+        yield "invoice_details", {}
+        return
+    
+    parser = IncrementalJsonParser()
+    try:
+        stream = await groq_client.chat.completions.create(
+            messages=_build_invoice_messages(base64_image),
+            model="meta-llama/llama-4-scout-17b-16e-instruct",
+            temperature=0.1,
+            max_tokens=_INVOICE_MAX_TOKENS,
+            stream=True
+        )
+        
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                for field in parser.feed(delta):
+                    yield field
+        
+    except Exception as e:
+        logger.error("❌ Error streaming details with Groq API: %s", e)
+        yield "invoice_details", {}
+        return
+    
+    # The assembled text goes through the same parsing as the non-streaming path
+    invoice_details = parse_invoice_information(parser.text)
+    if invoice_details:
+        await INVOICE_CACHE.aset(cache_key, invoice_details)
+    
+    yield "invoice_details", invoice_details
+
+
 def parse_invoice_information(text):
     """
     Parse invoice information from JSON text or dict.
     Cleans and extracts JSON from messy model outputs.
     """
     invoice_info = {}
-    currency_precision = Decimal("0.01")
 
     # Handle "no invoice" special case (case-insensitive)
     if "no_invoice_found" in str(text).lower():
@@ -139,41 +247,54 @@ def parse_invoice_information(text):
     if isinstance(text, dict):
         invoice_data = text
     else:
+        invoice_data = None
+
+        # Fast path: the prompt asks for bare JSON, so most responses parse as-is
+        stripped = text.strip()
+        if stripped.startswith("{") and stripped.endswith("}"):
+            try:
+                invoice_data = orjson.loads(stripped)
+            except orjson.JSONDecodeError:
+                pass
+
+    if invoice_data is None:
         # Try to extract JSON block if it's inside ```json ... ```
-        match = re.search(r"\{[\s\S]*\}", text)
+        match = _JSON_OBJ_RE.search(text)
         if match:
             text = match.group(0)
 
         # Remove trailing commas before } or ]
-        text = re.sub(r",(\s*[}\]])", r"\1", text)
+        text = _TRAILING_COMMA_RE.sub(r"\1", text)
 
         # Try parsing cleaned text
         try:
-            invoice_data = json.loads(text)
+            invoice_data = orjson.loads(text)
         except Exception as e:
-            print(f"❌ JSON parse failed: {e}")
+            logger.error("❌ JSON parse failed: %s", e)
             return {}
 
     # Ensure we have a dict
     if not isinstance(invoice_data, dict):
         return {}
 
-    # Extract fields with defaults
-    invoice_info["invoice_number"] = invoice_data.get("invoice_number", "Unknown")
-    invoice_info["client"] = invoice_data.get("client", "Unknown")
-    invoice_info["date"] = invoice_data.get("date", "Unknown")
-    invoice_info["payment_terms"] = invoice_data.get("payment_terms", "Not specified")
-    invoice_info["industry"] = invoice_data.get("industry", "Not specified")
-    invoice_info["total_amount"] = Decimal(invoice_data.get("total_amount", 0)).quantize(currency_precision)
-    invoice_info["currency"] = invoice_data.get("currency", "Unknown")
-    invoice_info["pending_amount"] = Decimal(invoice_data.get("pending_amount", 0)).quantize(currency_precision)
-    invoice_info["small_analysis"] = invoice_data.get("small_analysis", "N/A")
+    # Extract fields with defaults; the model may send nulls or numbers for text fields
+    invoice_info["invoice_number"] = _to_text(invoice_data.get("invoice_number"), "Unknown")
+    invoice_info["client"] = _to_text(invoice_data.get("client"), "Unknown")
+    invoice_info["date"] = _to_text(invoice_data.get("date"), "Unknown")
+    invoice_info["payment_terms"] = _to_text(invoice_data.get("payment_terms"), "Not specified")
+    invoice_info["industry"] = _to_text(invoice_data.get("industry"), "Not specified")
+    invoice_info["total_amount"] = _to_amount(invoice_data.get("total_amount"))
+    invoice_info["currency"] = _to_text(invoice_data.get("currency"), "Unknown")
+    invoice_info["pending_amount"] = _to_amount(invoice_data.get("pending_amount"))
+    invoice_info["small_analysis"] = _to_text(invoice_data.get("small_analysis"), "N/A")
     invoice_info["line_items"] = []
 
     # Process line items
-    for item in invoice_data.get("line_items", []):
-        description = item.get("description", "").strip()
-        amount = Decimal(item.get("amount", 0)).quantize(currency_precision)
+    for item in invoice_data.get("line_items") or []:
+        if not isinstance(item, dict):
+            continue
+        description = _to_text(item.get("description"), "").strip()
+        amount = _to_amount(item.get("amount"))
         if description:
             invoice_info["line_items"].append({
                 "description": description,
@@ -181,32 +302,39 @@ def parse_invoice_information(text):
             })
 
     # Handle tax and extra charges from API response or calculate if needed
-    invoice_info["tax_amount"] = Decimal(invoice_data.get("tax_amount", 0)).quantize(currency_precision)
-    invoice_info["extra_charges"] = Decimal(invoice_data.get("extra_charges", 0)).quantize(currency_precision)
+    invoice_info["tax_amount"] = _to_amount(invoice_data.get("tax_amount"))
+    invoice_info["extra_charges"] = _to_amount(invoice_data.get("extra_charges"))
     
     # If tax_amount and extra_charges are not provided, try to detect from difference
     if invoice_info["tax_amount"] == 0 and invoice_info["extra_charges"] == 0:
-        line_items_total = sum(item.get("amount", Decimal(0)) for item in invoice_info["line_items"])
-        difference = (invoice_info["total_amount"] - line_items_total).quantize(currency_precision)
+        line_items_total = sum(item["amount"] for item in invoice_info["line_items"])
+        difference = round(invoice_info["total_amount"] - line_items_total, 2)
 
-        if difference != Decimal(0):
-            text_check = json.dumps(invoice_data).lower()
+        if difference != 0:
+            text_check = orjson.dumps(invoice_data).decode().lower()
             if any(word in text_check for word in ["tax", "vat", "gst", "sales tax"]):
                 invoice_info["tax_amount"] = difference
             else:
                 invoice_info["extra_charges"] = difference
 
-    def convert_decimals(obj):
-        if isinstance(obj, list):
-            return [convert_decimals(i) for i in obj]
-        elif isinstance(obj, dict):
-            return {k: convert_decimals(v) for k, v in obj.items()}
-        elif isinstance(obj, Decimal):
-            return float(obj)
-        return obj
+    return invoice_info
+
+
 
-    return convert_decimals(invoice_info)
+def structure_invoice(invoice_info):
+    """
+    Wrap invoice info in the API response structure
+
+    Args:
+        invoice_info (dict): Parsed invoice details
 
+    Returns:
+        dict: Response payload
+    """
+    return {
+        "invoice_details": invoice_info,
+        "total_line_items": len(invoice_info.get("line_items", []))
+    }
 
 
 def structure_invoice_json(invoice_info):
@@ -219,32 +347,38 @@ if
     Returns:
         str: JSON-formatted string
     """
-    return json.dumps({
-        "invoice_details": invoice_info,
-        "total_line_items": len(invoice_info.get("line_items", []))
-    }, indent=2, ensure_ascii=False)
+    return orjson.dumps(structure_invoice(invoice_info), option=orjson.OPT_INDENT_2).decode()
 
 
-def main(image_path, groq_api_key):
+def main(image_path, groq_api_key, groq_client=None):
     """
     Main function to extract dosage details
     
     Args:
         image_path (str): Path to prescription image
         groq_api_key (str): Groq API key
+        groq_client: Shared AsyncGroq client; a new one is created if omitted
     """
     
  
     # Initialize Groq client
+    if groq_client is None:
+        try:
+            groq_client = AsyncGroq(api_key=groq_api_key)
+            
+        except Exception as e:
+            print(f"❌ Error initializing Groq client: {str(e)}")
+            return {}
+    
     try:
-        groq_client = Groq(api_key=groq_api_key)
-        
+        with open(image_path, "rb") as image_file:
+            image_bytes = image_file.read()
     except Exception as e:
-        print(f"❌ Error initializing Groq client: {str(e)}")
+        print(f"Error reading image: {str(e)}")
         return {}
     
     # Extract dosage details
-    details = extract_invoice_details(image_path, groq_client)
+    details = asyncio.run(extract_invoice_details(image_bytes, groq_client))
     details= structure_invoice_json(details)
     return details
 
@@ -1,28 +1,39 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, FastAPI, File, UploadFile, HTTPException
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-import shutil
+from pydantic import BaseModel, Field, ValidationError
 import os
-import json
+import orjson
+import logging
 import asyncio
 from typing import List, Dict, Optional
-from invoice_2 import main as extract_invoice_main
+from invoice_2 import extract_invoice_details, stream_invoice_details, structure_invoice
 from dotenv import load_dotenv
+from groq import AsyncGroq
+from groq_http import shared_async_http_client
 
 # Load environment variables from .env file
 load_dotenv()
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
 
-# Allow CORS for all origins (you can restrict in production)
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# One client per process so connections to the Groq API are reused across requests
+GROQ_CLIENT = AsyncGroq(api_key=GROQ_API_KEY, http_client=shared_async_http_client()) if GROQ_API_KEY else None
+
+# Largest batch accepted by /extract-invoices, and how many of its images
+# are sent to Groq at once
+MAX_BATCH_IMAGES = 20
+_BATCH_CONCURRENCY = 5
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    if GROQ_CLIENT is not None:
+        await GROQ_CLIENT.close()
+
+router = APIRouter(default_response_class=ORJSONResponse)
 
 class LineItem(BaseModel):
     description: str
@@ -44,77 +55,206 @@ class InvoiceResponse(BaseModel):
     invoice_details: InvoiceDetails
     total_line_items: int
 
-async def process_single_invoice(image: UploadFile, groq_api_key: str) -> dict:
-    """Process a single invoice image."""
+class BatchInvoiceResponse(BaseModel):
+    invoices: List[InvoiceResponse]
+    total_invoices: int
+
+def sse_event(event: str, data) -> bytes:
+    """Encode one server-sent event with a JSON payload."""
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+def validate_invoice(invoice_details: dict) -> dict:
+    """
+    Validate parsed invoice details against InvoiceResponse.
+
+    This also drops parser-only fields such as pending_amount and small_analysis.
+    """
+    return InvoiceResponse.model_validate(structure_invoice(invoice_details)).model_dump()
+
+def check_image_filename(image: UploadFile):
+    """Reject uploads that aren't PNG or JPG images."""
     if not image.filename.lower().endswith(('.png', '.jpg', '.jpeg')):
         raise HTTPException(status_code=400, detail=f"File {image.filename} must be a PNG or JPG image")
 
-    temp_image_path = f"temp_{image.filename}"
+async def process_single_invoice(image: UploadFile, groq_client: AsyncGroq) -> dict:
+    """Process a single invoice image."""
+    check_image_filename(image)
+
     try:
-        with open(temp_image_path, "wb") as buffer:
-            shutil.copyfileobj(image.file, buffer)
+        image_bytes = await image.read()
 
-        print("Extracting invoice...")
-        result_json = extract_invoice_main(temp_image_path, groq_api_key)
-        print(f"Processed {image.filename}: {result_json}")
-        return json.loads(result_json)
+        logger.debug("Extracting invoice %s", image.filename)
+        invoice_details = await extract_invoice_details(image_bytes, groq_client)
+        if not invoice_details:
+            raise ValueError("No invoice details extracted")
+        result_dict = validate_invoice(invoice_details)
+        logger.debug("Processed %s: %s", image.filename, result_dict)
+        return result_dict
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to process {image.filename}: {str(e)}")
-    finally:
-        if os.path.exists(temp_image_path):
-            os.remove(temp_image_path)
 
-@app.post("/extract-invoice", response_model=InvoiceResponse)
+@router.post("/extract-invoice", responses={200: {"model": InvoiceResponse}})
 async def extract_invoice(image: UploadFile = File(...)):
     """Extract invoice details from an invoice image."""
     if not image:
         raise HTTPException(status_code=400, detail="No images provided")
 
-    GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-    if not GROQ_API_KEY:
+    if GROQ_CLIENT is None:
         raise HTTPException(status_code=500, detail="GROQ_API_KEY not set in environment.")
 
     try:
-        print("Starting extraction...")
-        extraction = await process_single_invoice(image, GROQ_API_KEY)
-        print(f"Extraction result: {extraction}")
-        return InvoiceResponse(**extraction)
+        # process_single_invoice already validated against InvoiceResponse
+        extraction = await process_single_invoice(image, GROQ_CLIENT)
+        return ORJSONResponse(extraction)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Invoice extraction failed: {str(e)}")
 
-@app.get("/")
-def root():
-    return {
-        "message": "Invoice Extractor API. Upload an invoice image to extract structured details.",
-        "endpoints": {
-            "extract_invoice": {
-                "path": "/extract-invoice",
-                "method": "POST",
-                "description": "Upload an invoice image to get structured invoice details",
-                "request": {
-                    "image": "file (image)"
+@router.post("/extract-invoice/stream")
+async def stream_invoice(image: UploadFile = File(...)):
+    """
+    Stream invoice details as server-sent events.
+
+    Each top-level field is sent as a `field` event as soon as the model
+    finishes it; the last event is the validated `invoice_details`, or an
+    `error` event if nothing usable was extracted.
+    """
+    if not image:
+        raise HTTPException(status_code=400, detail="No images provided")
+
+    if GROQ_CLIENT is None:
+        raise HTTPException(status_code=500, detail="GROQ_API_KEY not set in environment.")
+
+    check_image_filename(image)
+
+    image_bytes = await image.read()
+
+    async def events():
+        # Field names come from the model, which reads a client-supplied image,
+        # so they go in the data rather than the SSE event name
+        async for field, value in stream_invoice_details(image_bytes, GROQ_CLIENT):
+            if field != "invoice_details":
+                yield sse_event("field", {"field": field, "value": value})
+                continue
+            try:
+                yield sse_event("invoice_details", validate_invoice(value)["invoice_details"])
+            except ValidationError:
+                yield sse_event("error", {"detail": "No invoice details extracted"})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@router.post("/extract-invoices", responses={200: {"model": BatchInvoiceResponse}})
+async def extract_invoices(images: List[UploadFile] = File(...)):
+    """Extract invoice details from several invoice images concurrently."""
+    if not images:
+        raise HTTPException(status_code=400, detail="No images provided")
+
+    if len(images) > MAX_BATCH_IMAGES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IMAGES} images per request")
+
+    if GROQ_CLIENT is None:
+        raise HTTPException(status_code=500, detail="GROQ_API_KEY not set in environment.")
+
+    # Reject the whole batch up front rather than after some calls were made
+    for image in images:
+        check_image_filename(image)
+
+    semaphore = asyncio.Semaphore(_BATCH_CONCURRENCY)
+
+    async def process(image: UploadFile) -> dict:
+        async with semaphore:
+            return await process_single_invoice(image, GROQ_CLIENT)
+
+    try:
+        # One Groq call per image, a few in flight at once; the first failure
+        # cancels the calls still running for the other images
+        async with asyncio.TaskGroup() as group:
+            tasks = [group.create_task(process(image)) for image in images]
+        extractions = [task.result() for task in tasks]
+        return ORJSONResponse({
+            "invoices": extractions,
+            "total_invoices": len(extractions)
+        })
+    except ExceptionGroup as eg:
+        error = eg.exceptions[0]
+        if isinstance(error, HTTPException):
+            raise error
+        raise HTTPException(status_code=500, detail=f"Invoice extraction failed: {str(error)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Invoice extraction failed: {str(e)}")
+
+# The service description never changes, so it is encoded once at import
+_ROOT_BYTES = orjson.dumps({
+    "message": "Invoice Extractor API. Upload an invoice image to extract structured details.",
+    "endpoints": {
+        "extract_invoice": {
+            "path": "/extract-invoice",
+            "method": "POST",
+            "description": "Upload an invoice image to get structured invoice details",
+            "request": {
+                "image": "file (image)"
+            },
+            "response": {
+                "invoice_details": {
+                    "invoice_number": "string",
+                    "client": "string",
+                    "date": "string",
+                    "payment_terms": "string",
+                    "industry": "string",
+                    "total_amount": "number",
+                    "currency": "string",
+                    "line_items": [
+                        {
+                            "description": "string",
+                            "amount": "number"
+                        }
+                    ],
+                    "tax_amount": "number (optional)",
+                    "extra_charges": "number (optional)"
                 },
-                "response": {
-                    "invoice_details": {
-                        "invoice_number": "string",
-                        "client": "string",
-                        "date": "string",
-                        "payment_terms": "string",
-                        "industry": "string",
-                        "total_amount": "number",
-                        "currency": "string",
-                        "line_items": [
-                            {
-                                "description": "string",
-                                "amount": "number"
-                            }
-                        ],
-                        "tax_amount": "number (optional)",
-                        "extra_charges": "number (optional)"
-                    },
-                    "total_line_items": "integer"
-                }
+                "total_line_items": "integer"
+            }
+        },
+        "stream_invoice": {
+            "path": "/extract-invoice/stream",
+            "method": "POST",
+            "description": "Same as extract_invoice, streamed as server-sent events per top-level field",
+            "request": {
+                "image": "file (image)"
+            },
+            "response": "text/event-stream; field events ({field, value}), then invoice_details (or error)"
+        },
+        "extract_invoices": {
+            "path": "/extract-invoices",
+            "method": "POST",
+            "description": "Upload several invoice images (at most 20) to get structured details for each",
+            "request": {
+                "images": "list of files (image)"
+            },
+            "response": {
+                "invoices": "list of extract_invoice responses",
+                "total_invoices": "integer"
             }
         }
     }
+})
+
+@router.get("/")
+async def root():
+    return Response(_ROOT_BYTES, media_type="application/json")
+
+# Standalone app for running this service on its own; server.py includes the router instead
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+
+# Allow CORS for all origins (you can restrict in production)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+app.include_router(router)
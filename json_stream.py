@@ -0,0 +1,140 @@
+"""
+Incremental parser for JSON objects streamed from the Groq API.
+
+Emits each top-level key of the object as soon as its value is
+complete, so callers can forward partial results while the model is
+still generating the rest.
+"""
+
+import re
+from typing import Optional
+
+import orjson
+
+# Only these characters can change bracket depth or string state
+_JSON_STRUCTURE_RE = re.compile(r'[{}\[\]"\\]')
+
+
+def extract_json_span(text: str, opener: str = "{") -> Optional[str]:
+    """
+    Return the first balanced JSON object or array in model output.
+
+    Scans once from the first `opener`, skipping brackets inside strings,
+    so prose or nested arrays after the JSON are never swallowed.
+
+    Args:
+        text (str): Model output, possibly wrapped in prose or code fences
+        opener (str): "{" to find an object, "[" to find an array
+
+    Returns:
+        str: The balanced JSON text, or None if there is none
+    """
+    start = text.find(opener)
+    if start == -1:
+        return None
+
+    depth = 0
+    in_string = False
+    escaped_pos = -1
+    for match in _JSON_STRUCTURE_RE.finditer(text, start):
+        i = match.start()
+        ch = text[i]
+
+        if in_string:
+            if i == escaped_pos:
+                continue
+            if ch == "\\":
+                escaped_pos = i + 1
+            elif ch == '"':
+                in_string = False
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+
+    return None
+
+
+class IncrementalJsonParser:
+    def __init__(self):
+        """Start with an empty buffer, outside of any JSON object."""
+        self.text = ""
+        self.done = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._member_start = None
+
+    def feed(self, chunk: str) -> list:
+        """
+        Append a streamed chunk and return newly completed top-level fields.
+
+        Args:
+            chunk (str): Next piece of model output
+
+        Returns:
+            list: (key, value) tuples for fields completed by this chunk
+        """
+        self.text += chunk
+        if self.done:
+            return []
+
+        text = self.text
+        members = []
+
+        # Each character is scanned exactly once across all feed() calls
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            # Ignore any preamble or code fence before the object opens
+            if self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1 and self._member_start is None:
+                    self._member_start = i
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                if self._depth == 1:
+                    self._emit(text, i, members)
+                    self._pos = i + 1
+                    self.done = True
+                    return members
+                self._depth -= 1
+            elif ch == "," and self._depth == 1:
+                self._emit(text, i, members)
+
+        self._pos = len(text)
+        return members
+
+    def _emit(self, text: str, end: int, members: list):
+        """Parse the `"key": value` span that ends at `end`, if any."""
+        start = self._member_start
+        self._member_start = None
+        if start is None:
+            return
+        try:
+            member = orjson.loads("{" + text[start:end] + "}")
+        except orjson.JSONDecodeError:
+            return
+        members.extend(member.items())
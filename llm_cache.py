@@ -0,0 +1,184 @@
+"""
+Two-tier response cache for Groq completions.
+
+L1 is an in-process TTL LRU shared by all requests on a worker.
+L2 is Redis, used only when REDIS_URL is set, so cached results
+survive restarts and are shared across workers. Async code uses the
+a-prefixed methods, which run Redis calls in a worker thread so a
+slow Redis never blocks the event loop.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait on Redis before treating the call as a miss
+_REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", "0.5"))
+
+
+def make_cache_key(data) -> str:
+    """
+    Build a stable 128-bit BLAKE2b cache key.
+
+    Args:
+        data: Raw bytes (e.g. an encoded image) or a JSON-serializable object
+
+    Returns:
+        str: Hex digest of the canonicalized input
+    """
+    if isinstance(data, (bytes, bytearray)):
+        payload = data
+    else:
+        payload = orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def _connect_redis():
+    """Return a Redis client if REDIS_URL is configured, else None."""
+    redis_url = os.getenv("REDIS_URL")
+    if not redis_url:
+        return None
+    try:
+        import redis
+        return redis.Redis.from_url(
+            redis_url, socket_timeout=_REDIS_TIMEOUT, socket_connect_timeout=_REDIS_TIMEOUT
+        )
+    except Exception as e:
+        logger.warning("⚠️ Redis cache unavailable: %s", e)
+        return None
+
+
+class ResponseCache:
+    def __init__(self, namespace: str, maxsize: int = 10_000, ttl: int = 600, local_ttl: int = None):
+        """
+        Create a cache whose Redis keys are prefixed with `namespace`.
+
+        `local_ttl` caps how long the in-process tier keeps an entry, so a
+        clear() issued on one worker reaches the others within that time.
+        """
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.local_ttl = min(ttl, local_ttl) if local_ttl else ttl
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self._redis = None
+        self._redis_checked = False
+
+    def _get_redis(self):
+        if not self._redis_checked:
+            self._redis = _connect_redis()
+            self._redis_checked = True
+        return self._redis
+
+    def _set_local(self, key: str, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.local_ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _get_local(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                return value
+            del self._entries[key]
+            return None
+
+    def _get_remote(self, redis_client, key: str):
+        try:
+            raw = redis_client.get(f"{self.namespace}:{key}")
+        except Exception as e:
+            logger.warning("⚠️ Redis cache read failed: %s", e)
+            return None
+        if raw is None:
+            return None
+
+        try:
+            value = orjson.loads(raw)
+        except orjson.JSONDecodeError as e:
+            logger.warning("⚠️ Redis cache entry is not valid JSON: %s", e)
+            return None
+        self._set_local(key, value)
+        return value
+
+    def _set_remote(self, redis_client, key: str, payload: bytes):
+        try:
+            redis_client.set(f"{self.namespace}:{key}", payload, ex=self.ttl)
+        except Exception as e:
+            logger.warning("⚠️ Redis cache write failed: %s", e)
+
+    def get(self, key: str):
+        """Return the cached value for `key`, or None on a miss."""
+        value = self._get_local(key)
+        if value is not None:
+            return value
+        redis_client = self._get_redis()
+        if redis_client is None:
+            return None
+        return self._get_remote(redis_client, key)
+
+    async def aget(self, key: str):
+        """Like get(), but the Redis lookup runs off the event loop."""
+        value = self._get_local(key)
+        if value is not None:
+            return value
+        redis_client = self._get_redis()
+        if redis_client is None:
+            return None
+        return await asyncio.to_thread(self._get_remote, redis_client, key)
+
+    def set(self, key: str, value):
+        """Store `value` in both cache tiers."""
+        self._set_local(key, value)
+        redis_client = self._get_redis()
+        if redis_client is not None:
+            self._set_remote(redis_client, key, orjson.dumps(value))
+
+    async def aset(self, key: str, value):
+        """Like set(), but the Redis write runs off the event loop."""
+        self._set_local(key, value)
+        redis_client = self._get_redis()
+        if redis_client is not None:
+            await asyncio.to_thread(self._set_remote, redis_client, key, orjson.dumps(value))
+
+    def clear(self):
+        """
+        Drop every entry in this namespace from Redis and this process's tier.
+
+        Other workers keep their in-process entries until `local_ttl` expires.
+        """
+        with self._lock:
+            self._entries.clear()
+
+        redis_client = self._get_redis()
+        if redis_client is None:
+            return
+        try:
+            batch = []
+            for key in redis_client.scan_iter(match=f"{self.namespace}:*", count=1000):
+                batch.append(key)
+                if len(batch) == 1000:
+                    redis_client.unlink(*batch)
+                    batch.clear()
+            if batch:
+                redis_client.unlink(*batch)
+        except Exception as e:
+            logger.warning("⚠️ Redis cache clear failed: %s", e)
+
+    async def aclear(self):
+        """Like clear(), but the Redis scan runs off the event loop."""
+        await asyncio.to_thread(self.clear)
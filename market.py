@@ -1,230 +1,201 @@
-import json
+import asyncio
+import functools
+import operator
 import re
-from typing import Dict, List
-from groq import Groq
+import sys
+import textwrap
+import ahocorasick
+import msgspec
+import orjson
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Union
 from datetime import datetime
-from dotenv import load_dotenv
 import os
 import time
+from llm_cache import ResponseCache, make_cache_key
+from json_stream import IncrementalJsonParser
+
+# groq, httpx and dotenv are imported on first use, so callers that only
+# need the parsing/detection helpers don't pay for them at import time
+if TYPE_CHECKING:
+    from groq import AsyncGroq, Groq
 
-# Load API keys
-load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
+# Each worker's in-process copy expires after 5 minutes, so /cache/invalidate,
+# which can only clear the local tier of the worker it reaches, takes effect
+# everywhere shortly after; Redis keeps analyses for a day
+DISCOVERY_CACHE = ResponseCache("market-discovery", local_ttl=300)
+SUITABILITY_CACHE = ResponseCache("market-suitability", ttl=86_400, local_ttl=300)
 
-class EcommercePlatformAnalyzer:
-    def __init__(self, groq_api_key: str):
-        """Initialize the analyzer with API credentials."""
-        self.groq_client = Groq(api_key=groq_api_key)
-
-        self.known_platforms = {
-            # B2C Platforms
-            "Amazon": "https://www.amazon.in",
-            "Flipkart": "https://www.flipkart.com",
-            "Myntra": "https://www.myntra.com",
-            "Ajio": "https://www.ajio.com",
-            "Meesho": "https://www.meesho.com",
-            "Snapdeal": "https://www.snapdeal.com",
-            "Nykaa": "https://www.nykaa.com",
-            "BigBasket": "https://www.bigbasket.com",
-            "Grofers": "https://blinkit.com",
-            "Paytm Mall": "https://paytmmall.com",
-            "Shopclues": "https://www.shopclues.com",
-            "Tata CLiQ": "https://www.tatacliq.com",
-            "JioMart": "https://www.jiomart.com",
-            "FirstCry": "https://www.firstcry.com",
-            
-            # B2B & Hybrid Platforms
-            "ONDC Network": "https://ondc.org",
-            "IndiaMART": "https://www.indiamart.com",
-            "TradeIndia": "https://www.tradeindia.com",
-            "Amazon Business": "https://business.amazon.in",
-            "Alibaba India": "https://www.alibaba.com/countrysearch/IN",
-            "Government e-Marketplace (GeM)": "https://gem.gov.in",
-            "Udaan": "https://udaan.com",
-            "ExportersIndia": "https://www.exportersindia.com",
-            "Global Sources": "https://www.globalsources.com",
-            "DHgate": "https://www.dhgate.com"
-        }
+_JSON_FENCE_RE = re.compile(r"```json\s*", re.IGNORECASE)
+_CODE_FENCE_RE = re.compile(r"```\s*")
+_TRAILING_COMMA_RE = re.compile(r",(\s*[}\]])")
+_NEWLINE_WS_RE = re.compile(r"\n\s*")
 
-        # B2B Categories and Keywords
-        self.b2b_keywords = [
-            'industrial', 'commercial', 'wholesale', 'bulk', 'professional', 'corporate',
-            'business', 'office', 'manufacturing', 'equipment', 'machinery', 'tools',
-            'safety', 'medical', 'laboratory', 'construction', 'automotive parts',
-            'electronic components', 'raw materials', 'packaging materials',
-            'chemicals', 'pharmaceuticals', 'textiles', 'metals', 'plastics'
-        ]
+# The Groq SDK retries 408/409/429/5xx and connection errors with jittered
+# exponential backoff, honoring Retry-After; allow more attempts than its
+# default of 2 so a burst of rate limiting doesn't empty the analysis
+_GROQ_MAX_RETRIES = 5
 
-        self.b2b_target_audiences = [
-            'companies', 'manufacturers', 'distributors', 'retailers', 'wholesalers',
-            'businesses', 'enterprises', 'industries', 'factories', 'workshops',
-            'hospitals', 'clinics', 'laboratories', 'schools', 'offices',
-            'construction', 'automotive', 'mining', 'agriculture'
-        ]
+# Products analyzed at once by main_batch; each holds up to one Groq request
+_MAX_CONCURRENT_ANALYSES = 5
 
-        # Category-specific platform mapping
-        self.category_platforms = {
-            # B2B Categories
-            "Industrial": ["IndiaMART", "TradeIndia", "Amazon Business", "Government e-Marketplace (GeM)", "ONDC Network"],
-            "Safety Equipment": ["IndiaMART", "Government e-Marketplace (GeM)", "Amazon Business", "TradeIndia"],
-            "Office Supplies": ["Amazon Business", "IndiaMART", "Udaan", "Government e-Marketplace (GeM)"],
-            "Manufacturing": ["IndiaMART", "TradeIndia", "Alibaba India", "ExportersIndia", "ONDC Network"],
-            "Construction": ["IndiaMART", "Government e-Marketplace (GeM)", "TradeIndia", "Amazon Business"],
-            "Medical Equipment": ["IndiaMART", "Government e-Marketplace (GeM)", "Amazon Business", "TradeIndia"],
-            "Electronic Components": ["IndiaMART", "Amazon Business", "TradeIndia", "Alibaba India"],
-            "Automotive Parts": ["IndiaMART", "TradeIndia", "Amazon Business", "Alibaba India"],
-            "Chemicals": ["IndiaMART", "TradeIndia", "ExportersIndia", "Alibaba India"],
-            "Textiles": ["IndiaMART", "TradeIndia", "ExportersIndia", "ONDC Network"],
-            "Packaging": ["IndiaMART", "TradeIndia", "Amazon Business", "Alibaba India"],
-            
-            # B2C Categories
-            "Food & Grocery": ["BigBasket", "JioMart", "Grofers", "ONDC Network"],
-            "Fashion": ["Myntra", "Ajio", "Amazon", "Flipkart", "Meesho"],
-            "Beauty": ["Nykaa", "Amazon", "Flipkart", "Myntra"],
-            "Electronics": ["Amazon", "Flipkart", "Tata CLiQ", "Paytm Mall"],
-            "Baby & Kids": ["FirstCry", "Amazon", "Flipkart"],
-            
-            # Local & Artisan
-            "Handmade": ["ONDC Network", "Meesho", "Amazon", "IndiaMART"],
-            "Local Products": ["ONDC Network", "Meesho", "JioMart"]
-        }
+_HTTP_LIMITS = {"max_connections": 100, "max_keepalive_connections": 100, "keepalive_expiry": 60.0}
 
-    def is_b2b_product(self, product_details: Dict) -> bool:
-        """Detect if a product is B2B based on various indicators."""
-        product_name = product_details.get('name', '').lower()
-        category = product_details.get('category', '').lower()
-        description = product_details.get('description', '').lower()
-        target_audience = product_details.get('target_audience', '').lower()
-        features = ' '.join(product_details.get('features', [])).lower()
-        
-        # Check for B2B keywords in all fields
-        all_text = f"{product_name} {category} {description} {target_audience} {features}"
-        
-        b2b_score = 0
-        
-        # Strong B2B indicators
-        for keyword in self.b2b_keywords:
-            if keyword in all_text:
-                b2b_score += 2
-        
-        # Target audience indicators
-        for audience in self.b2b_target_audiences:
-            if audience in target_audience:
-                b2b_score += 3
-        
-        # Category-based detection
-        b2b_categories = [
-            'industrial', 'commercial', 'office', 'manufacturing', 'construction',
-            'medical equipment', 'safety', 'laboratory', 'automotive parts',
-            'electronic components', 'chemicals', 'machinery', 'tools'
-        ]
-        
-        for b2b_cat in b2b_categories:
-            if b2b_cat in category:
-                b2b_score += 3
-        
-        # Price-based indicator (higher prices often indicate B2B)
-        price = product_details.get('price', 0)
-        if price > 5000:  # Products over ₹5000 might be B2B
-            b2b_score += 1
-        
-        # Return True if B2B score is 3 or higher
-        return b2b_score >= 3
+# One pooled HTTP/2 connection pool per process, so analyses reuse warm
+# TLS connections to Groq instead of handshaking on every call
+_HTTP_CLIENT = None
+_GROQ_CLIENT = None
 
-    def discover_platforms_with_groq(self, product_details: Dict) -> List[str]:
-        """Discover relevant e-commerce platforms using Groq API instead of Google Search."""
-        product_name = product_details.get('name', '')
-        category = product_details.get('category', '')
-        
-        # Detect if product is B2B
-        is_b2b = self.is_b2b_product(product_details)
-        
-        # Start with category-specific platforms
-        discovered_platforms = set()
-        
-        # Check if category matches any specific platform categories
-        for cat_key, platforms in self.category_platforms.items():
-            if cat_key.lower() in category.lower() or any(word in category.lower() for word in cat_key.lower().split()):
-                discovered_platforms.update(platforms)
 
-        # Use Groq to get additional platform recommendations
-        prompt = f"""You are an e-commerce platform expert for India. Based on the product details below, recommend the most suitable Indian e-commerce platforms.
+def _load_api_key() -> Optional[str]:
+    """Return GROQ_API_KEY, reading .env the first time it is missing."""
+    global GROQ_API_KEY
+    if GROQ_API_KEY is None:
+        from dotenv import load_dotenv
+        load_dotenv()
+        GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+    return GROQ_API_KEY
 
-Product Details:
-- Name: {product_name}
-- Category: {category}
-- Product Type: {"B2B (Business-to-Business)" if is_b2b else "B2C (Business-to-Consumer)"}
-- Target Audience: {product_details.get('target_audience', '')}
-- Price: ₹{product_details.get('price', 0)}
 
-Available platforms to choose from:
-{list(self.known_platforms.keys())}
+def _get_groq_client(groq_api_key: Optional[str] = None) -> "Groq":
+    """Return a Groq client on the shared connection pool, creating it on first use."""
+    global _HTTP_CLIENT, _GROQ_CLIENT
+    import httpx
+    from groq import Groq
 
-Consider these factors:
-- Product category fit
-- Target audience alignment
-- Business model (B2B vs B2C)
-- Market presence in India
-- Commission structure
-- Platform specialization
+    if _HTTP_CLIENT is None:
+        _HTTP_CLIENT = httpx.Client(http2=True, limits=httpx.Limits(**_HTTP_LIMITS))
 
-Return ONLY a JSON array of the top 8-10 most suitable platform names from the available list above.
-Example format: ["Amazon", "Flipkart", "IndiaMART", "Myntra"]"""
+    env_api_key = _load_api_key()
+    if env_api_key and groq_api_key in (None, env_api_key):
+        if _GROQ_CLIENT is None:
+            _GROQ_CLIENT = Groq(api_key=env_api_key, http_client=_HTTP_CLIENT,
+                                max_retries=_GROQ_MAX_RETRIES)
+        return _GROQ_CLIENT
+    return Groq(api_key=groq_api_key, http_client=_HTTP_CLIENT, max_retries=_GROQ_MAX_RETRIES)
 
-        try:
-            chat_completion = self.groq_client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model="llama-3.1-8b-instant",
-                temperature=0.3,
-                max_tokens=500
-            )
-            
-            response_text = chat_completion.choices[0].message.content
-            # Parse JSON response - find array brackets
-            start_bracket = response_text.find('[')
-            end_bracket = response_text.rfind(']')
-            
-            if start_bracket != -1 and end_bracket != -1 and end_bracket > start_bracket:
-                json_str = response_text[start_bracket:end_bracket + 1]
-                try:
-                    groq_platforms = json.loads(json_str)
-                    discovered_platforms.update([p for p in groq_platforms if p in self.known_platforms])
-                except json.JSONDecodeError:
-                    print("⚠️ Failed to parse platform recommendations from Groq")
-        
-        except Exception as e:
-            print(f"⚠️ Groq platform discovery failed: {e}")
 
-        # Essential platforms based on product type
-        if is_b2b:
-            # Always include these B2B platforms
-            essential_platforms = ['IndiaMART', 'Amazon Business', 'ONDC Network', 'Government e-Marketplace (GeM)']
-        else:
-            # Always include these B2C platforms
-            essential_platforms = ['Amazon', 'Flipkart', 'ONDC Network']
-        
-        discovered_platforms.update(essential_platforms)
-        
-        return list(discovered_platforms)
+def create_async_groq_client(groq_api_key: Optional[str] = None, http_client=None) -> "AsyncGroq":
+    """
+    Create an AsyncGroq client, on the process-wide HTTP/2 connection pool
+    unless a private `http_client` is given.
+    """
+    from groq import AsyncGroq
+    from groq_http import shared_async_http_client
 
-    def analyze_platform_suitability(self, product_details: Dict, platforms: List[str]) -> Dict:
-        """Use Groq API to analyze and rank platforms by suitability."""
-        
-        # Detect if product is B2B
-        is_b2b = self.is_b2b_product(product_details)
-        
-        prompt = f"""You are an e-commerce platform analysis expert specializing in both B2C and B2B platforms in India.
+    return AsyncGroq(api_key=groq_api_key, http_client=http_client or shared_async_http_client(),
+                     max_retries=_GROQ_MAX_RETRIES)
 
-Product Details:
-{json.dumps(product_details, indent=2)}
 
-Available Platforms:
-{json.dumps(platforms, indent=2)}
+# Free-text fields in model output; numbers are accepted and stringified
+_Text = Union[str, int, float, None]
+_TEXT_FIELDS = ("reasoning", "gst_taxes", "other_charges", "profit", "final_selling_charge",
+                "commission_fees", "target_audience_match", "category_fit", "competition_level",
+                "business_model", "bulk_order_benefits", "verification_standards",
+                "recommended_strategy")
+
+
+class PlatformInfo(msgspec.Struct):
+    """Per-platform fields read by analyze_product; other keys are skipped."""
+    rank: int = 999
+    score: float = 0.0
+    reasoning: _Text = ""
+    gst_taxes: _Text = "Unknown"
+    other_charges: _Text = "Unknown"
+    profit: _Text = msgspec.field(default="Unknown", name="profit_analysis")
+    final_selling_charge: _Text = "Unknown"
+    commission_fees: _Text = "Unknown"
+    advantages: List[_Text] = []
+    disadvantages: List[_Text] = []
+    target_audience_match: _Text = "Unknown"
+    category_fit: _Text = "Unknown"
+    competition_level: _Text = "Unknown"
+    business_model: _Text = "Unknown"
+    bulk_order_benefits: _Text = ""
+    verification_standards: _Text = ""
+    recommended_strategy: _Text = ""
+
+    def __post_init__(self):
+        """Stringify numeric text values, then intern the rating fields."""
+        # The model sometimes answers with bare numbers (e.g. "profit_analysis": 250);
+        # msgspec won't coerce those to str, so they are accepted and converted here
+        for field in _TEXT_FIELDS:
+            value = getattr(self, field)
+            if isinstance(value, (int, float)):
+                setattr(self, field, str(value))
+        for field in ("advantages", "disadvantages"):
+            items = getattr(self, field)
+            if any(isinstance(item, (int, float)) for item in items):
+                setattr(self, field, [str(item) if isinstance(item, (int, float)) else item for item in items])
+
+        # Free-form values are kept as-is rather than rejected with a Literal
+        if self.target_audience_match:
+            self.target_audience_match = sys.intern(self.target_audience_match)
+        if self.category_fit:
+            self.category_fit = sys.intern(self.category_fit)
+        if self.competition_level:
+            self.competition_level = sys.intern(self.competition_level)
+        if self.business_model:
+            self.business_model = sys.intern(self.business_model)
+
+
+class AnalysisResponse(msgspec.Struct):
+    """Top-level shape of the platform suitability response."""
+    platform_analysis: Dict[str, PlatformInfo] = {}
+    overall_recommendations: dict = {}
+
+
+class ProductAnalysis(AnalysisResponse):
+    """One product's entry in a batched suitability response."""
+    product_index: int = -1
+
+
+class BatchAnalysisResponse(msgspec.Struct):
+    """Top-level shape of a batched platform suitability response."""
+    results: List[ProductAnalysis] = []
+
 
-Product Type: {"B2B (Business-to-Business)" if is_b2b else "B2C (Business-to-Consumer)"}
+_EMPTY_PLATFORM = PlatformInfo()
 
-🔍 *B2B Platform Specializations:*
+# Fields the API response model requires; an analysis missing any of them is
+# not cached, so one malformed reply isn't served again for the whole TTL
+_REQUIRED_RECOMMENDATIONS = ("diversification_strategy", "pricing_considerations", "marketing_focus")
+_REQUIRED_PLATFORM_FIELDS = ("reasoning", "target_audience_match", "category_fit",
+                             "competition_level", "recommended_strategy")
+
+
+def _is_complete_analysis(analysis: AnalysisResponse, platforms: List[str]) -> bool:
+    """Return True if the analysis covers every platform with the fields the API response needs."""
+    recommendations = analysis.overall_recommendations
+    if not set(platforms) <= analysis.platform_analysis.keys():
+        return False
+    if not analysis.platform_analysis or not isinstance(recommendations.get("top_3_platforms"), list):
+        return False
+    if not all(isinstance(recommendations.get(key), str) for key in _REQUIRED_RECOMMENDATIONS):
+        return False
+    return all(
+        getattr(info, field) is not None
+        for info in analysis.platform_analysis.values()
+        for field in _REQUIRED_PLATFORM_FIELDS
+    )
+
+_DISCOVERY_PARAMS = {
+    "model": "llama-3.1-8b-instant",
+    "temperature": 0.3,
+    "max_tokens": 500,
+}
+
+_SUITABILITY_PARAMS = {
+    "model": "llama-3.1-8b-instant",
+    "temperature": 0.1,
+    "max_tokens": 4000,
+    "top_p": 0.9,
+    "stop": None,
+}
+
+# Platform notes and calculation rules shared by single and batched prompts
+_SUITABILITY_GUIDE = """🔍 *B2B Platform Specializations:*
 - *IndiaMART*: India's largest B2B marketplace, 2-5% commission, verified suppliers, trade credit facilities
 - *Government e-Marketplace (GeM)*: Government procurement platform, transparent pricing, quality assurance, tender opportunities
 - *ONDC Network*: Open network supporting both B2B & B2C, 2-3% commission, direct customer relationships, government backing
@@ -257,12 +228,11 @@ For B2B products, emphasize:
 - Trade credit facilities
 - Quality certifications
 - Supplier verification
-- Export opportunities
+- Export opportunities"""
 
-Return JSON only:
-{{
-    "platform_analysis": {{
-        "platform_name": {{
+# Members of the JSON object expected back for one product
+_SUITABILITY_SCHEMA = """    "platform_analysis": {
+        "platform_name": {
             "rank": "number",
             "score": "number (0-100)",
             "reasoning": "string",
@@ -280,59 +250,609 @@ Return JSON only:
             "bulk_order_benefits": "string (for B2B platforms)",
             "verification_standards": "string (quality checks, certifications)",
             "recommended_strategy": "string"
-        }}
-    }},
-    "overall_recommendations": {{
+        }
+    },
+    "overall_recommendations": {
         "top_3_platforms": ["list"],
         "diversification_strategy": "string",
         "pricing_considerations": "string",
         "marketing_focus": "string",
         "b2b_specific_advice": "string (if B2B product)"
-    }}
-}}"""
+    }"""
+
+_BATCH_SUITABILITY_SCHEMA = textwrap.indent(_SUITABILITY_SCHEMA, " " * 8)
+
+# Completion budget for a batched call, whatever the number of products
+_BATCH_MAX_TOKENS = 8000
+
+# Completion budget per analyzed platform, plus the recommendations block,
+# for calls covering only a few platforms
+_TOKENS_PER_PLATFORM = 500
+_RECOMMENDATIONS_TOKENS = 500
+
+
+KNOWN_PLATFORMS = {
+    # B2C Platforms
+    "Amazon": "https://www.amazon.in",
+    "Flipkart": "https://www.flipkart.com",
+    "Myntra": "https://www.myntra.com",
+    "Ajio": "https://www.ajio.com",
+    "Meesho": "https://www.meesho.com",
+    "Snapdeal": "https://www.snapdeal.com",
+    "Nykaa": "https://www.nykaa.com",
+    "BigBasket": "https://www.bigbasket.com",
+    "Grofers": "https://blinkit.com",
+    "Paytm Mall": "https://paytmmall.com",
+    "Shopclues": "https://www.shopclues.com",
+    "Tata CLiQ": "https://www.tatacliq.com",
+    "JioMart": "https://www.jiomart.com",
+    "FirstCry": "https://www.firstcry.com",
+    
+    # B2B & Hybrid Platforms
+    "ONDC Network": "https://ondc.org",
+    "IndiaMART": "https://www.indiamart.com",
+    "TradeIndia": "https://www.tradeindia.com",
+    "Amazon Business": "https://business.amazon.in",
+    "Alibaba India": "https://www.alibaba.com/countrysearch/IN",
+    "Government e-Marketplace (GeM)": "https://gem.gov.in",
+    "Udaan": "https://udaan.com",
+    "ExportersIndia": "https://www.exportersindia.com",
+    "Global Sources": "https://www.globalsources.com",
+    "DHgate": "https://www.dhgate.com"
+}
+
+# B2B Categories and Keywords
+B2B_KEYWORDS = frozenset([
+    'industrial', 'commercial', 'wholesale', 'bulk', 'professional', 'corporate',
+    'business', 'office', 'manufacturing', 'equipment', 'machinery', 'tools',
+    'safety', 'medical', 'laboratory', 'construction', 'automotive parts',
+    'electronic components', 'raw materials', 'packaging materials',
+    'chemicals', 'pharmaceuticals', 'textiles', 'metals', 'plastics'
+])
+
+B2B_TARGET_AUDIENCES = frozenset([
+    'companies', 'manufacturers', 'distributors', 'retailers', 'wholesalers',
+    'businesses', 'enterprises', 'industries', 'factories', 'workshops',
+    'hospitals', 'clinics', 'laboratories', 'schools', 'offices',
+    'construction', 'automotive', 'mining', 'agriculture'
+])
+
+B2B_CATEGORIES = frozenset([
+    'industrial', 'commercial', 'office', 'manufacturing', 'construction',
+    'medical equipment', 'safety', 'laboratory', 'automotive parts',
+    'electronic components', 'chemicals', 'machinery', 'tools'
+])
+
+# Category-specific platform mapping
+CATEGORY_PLATFORMS = {cat_key: frozenset(platforms) for cat_key, platforms in {
+    # B2B Categories
+    "Industrial": ["IndiaMART", "TradeIndia", "Amazon Business", "Government e-Marketplace (GeM)", "ONDC Network"],
+    "Safety Equipment": ["IndiaMART", "Government e-Marketplace (GeM)", "Amazon Business", "TradeIndia"],
+    "Office Supplies": ["Amazon Business", "IndiaMART", "Udaan", "Government e-Marketplace (GeM)"],
+    "Manufacturing": ["IndiaMART", "TradeIndia", "Alibaba India", "ExportersIndia", "ONDC Network"],
+    "Construction": ["IndiaMART", "Government e-Marketplace (GeM)", "TradeIndia", "Amazon Business"],
+    "Medical Equipment": ["IndiaMART", "Government e-Marketplace (GeM)", "Amazon Business", "TradeIndia"],
+    "Electronic Components": ["IndiaMART", "Amazon Business", "TradeIndia", "Alibaba India"],
+    "Automotive Parts": ["IndiaMART", "TradeIndia", "Amazon Business", "Alibaba India"],
+    "Chemicals": ["IndiaMART", "TradeIndia", "ExportersIndia", "Alibaba India"],
+    "Textiles": ["IndiaMART", "TradeIndia", "ExportersIndia", "ONDC Network"],
+    "Packaging": ["IndiaMART", "TradeIndia", "Amazon Business", "Alibaba India"],
+    
+    # B2C Categories
+    "Food & Grocery": ["BigBasket", "JioMart", "Grofers", "ONDC Network"],
+    "Fashion": ["Myntra", "Ajio", "Amazon", "Flipkart", "Meesho"],
+    "Beauty": ["Nykaa", "Amazon", "Flipkart", "Myntra"],
+    "Electronics": ["Amazon", "Flipkart", "Tata CLiQ", "Paytm Mall"],
+    "Baby & Kids": ["FirstCry", "Amazon", "Flipkart"],
+    
+    # Local & Artisan
+    "Handmade": ["ONDC Network", "Meesho", "Amazon", "IndiaMART"],
+    "Local Products": ["ONDC Network", "Meesho", "JioMart"]
+}.items()}
+
+# Name-only views of KNOWN_PLATFORMS, which itself maps names to homepages
+KNOWN_PLATFORM_SET = frozenset(KNOWN_PLATFORMS)
+KNOWN_PLATFORM_NAMES_JSON = orjson.dumps(list(KNOWN_PLATFORMS)).decode()
+
+# Platforms always included for each product type
+ESSENTIAL_B2B = frozenset({'IndiaMART', 'Amazon Business', 'ONDC Network', 'Government e-Marketplace (GeM)'})
+ESSENTIAL_B2C = frozenset({'Amazon', 'Flipkart', 'ONDC Network'})
+
+
+def _build_automaton(terms: Iterable[str]) -> ahocorasick.Automaton:
+    """Build an Aho-Corasick automaton that reports each matched term."""
+    automaton = ahocorasick.Automaton()
+    for term in terms:
+        automaton.add_word(term, term)
+    automaton.make_automaton()
+    return automaton
+
+
+def _build_category_automaton(category_platforms: Dict[str, frozenset]) -> ahocorasick.Automaton:
+    """Map every word of every category key to the platforms it implies."""
+    word_platforms = {}
+    for cat_key, platforms in category_platforms.items():
+        for word in cat_key.lower().split():
+            word_platforms.setdefault(word, set()).update(platforms)
+
+    automaton = ahocorasick.Automaton()
+    for word, platforms in word_platforms.items():
+        automaton.add_word(word, frozenset(platforms))
+    automaton.make_automaton()
+    return automaton
+
+
+def _find_terms(automaton: ahocorasick.Automaton, text: str) -> set:
+    """Return the distinct terms that start at a word boundary in `text`."""
+    # Checking only the start keeps plurals ("businesses") but skips
+    # matches inside other words ("biomedical")
+    found = set()
+    for end, term in automaton.iter(text):
+        start = end - len(term) + 1
+        if start == 0 or not text[start - 1].isalnum():
+            found.add(term)
+    return found
+
+
+# Aho-Corasick automata for is_b2b_product: one linear pass per field
+_B2B_KW_AUT = _build_automaton(B2B_KEYWORDS)
+_B2B_AUD_AUT = _build_automaton(B2B_TARGET_AUDIENCES)
+_B2B_CAT_AUT = _build_automaton(B2B_CATEGORIES)
+
+# Trie of CATEGORY_PLATFORMS key words, matched anywhere in a category
+_CATEGORY_AUT = _build_category_automaton(CATEGORY_PLATFORMS)
+
+
+_PRODUCT_TYPES = {True: "B2B (Business-to-Business)", False: "B2C (Business-to-Consumer)"}
+
+# Prompt templates: the static text (platform list, guide, schema) is built
+# once here and only the per-product fields are filled in on each call
+_DISCOVERY_PROMPT_TEMPLATE = """You are an e-commerce platform expert for India. Based on the product details below, recommend the most suitable Indian e-commerce platforms.
+
+Product Details:
+- Name: {name}
+- Category: {category}
+- Product Type: {product_type}
+- Target Audience: {target_audience}
+- Price: ₹{price}
+
+Available platforms to choose from:
+""" + KNOWN_PLATFORM_NAMES_JSON + """
+
+Consider these factors:
+- Product category fit
+- Target audience alignment
+- Business model (B2B vs B2C)
+- Market presence in India
+- Commission structure
+- Platform specialization
+
+Return ONLY a JSON array of the top 8-10 most suitable platform names from the available list above.
+Example format: ["Amazon", "Flipkart", "IndiaMART", "Myntra"]"""
+
+_SUITABILITY_PROMPT_HEAD = """You are an e-commerce platform analysis expert specializing in both B2C and B2B platforms in India.
+
+Product Details:
+{product_json}
+
+Available Platforms:
+{platforms_json}
+
+Product Type: {product_type}
+
+"""
+
+_SUITABILITY_PROMPT_TAIL = _SUITABILITY_GUIDE + "\n\nReturn JSON only:\n{\n" + _SUITABILITY_SCHEMA + "\n}"
+
+_BATCH_PRODUCT_SECTION_TEMPLATE = """Product {index}:
+{product_json}
+
+Available Platforms for product {index}:
+{platforms_json}
+
+Product Type: {product_type}"""
+
+_BATCH_SUITABILITY_PROMPT_HEAD = """You are an e-commerce platform analysis expert specializing in both B2C and B2B platforms in India.
+
+Analyze each of the {count} products below separately, only against its own available platforms.
+
+{products_text}
+
+"""
+
+_BATCH_SUITABILITY_PROMPT_TAIL = _SUITABILITY_GUIDE + """
+
+Return JSON only, with one entry in "results" per product:
+{
+    "results": [
+        {
+            "product_index": "number (index of the product above)",
+""" + _BATCH_SUITABILITY_SCHEMA + """
+        }
+    ]
+}"""
+
+
+class EcommercePlatformAnalyzer:
+    def __init__(self, groq_api_key: Optional[str] = None, groq_client: Optional["Groq"] = None,
+                 async_groq_client: Optional["AsyncGroq"] = None):
+        """Initialize the analyzer, reusing the shared Groq client when possible."""
+        if groq_client is None:
+            groq_client = _get_groq_client(groq_api_key)
+        self.groq_client = groq_client
+        self.async_groq_client = async_groq_client
+
+        # Bound per instance so the cache is released along with the analyzer
+        self._is_b2b_cached = functools.lru_cache(maxsize=1024)(self._score_b2b)
+
+    @staticmethod
+    def _product_fingerprint(product_details: Dict) -> tuple:
+        """Return the normalized product fields that B2B detection and discovery use."""
+        return (
+            product_details.get('name', '').lower(),
+            product_details.get('category', '').lower(),
+            product_details.get('description', '').lower(),
+            product_details.get('target_audience', '').lower(),
+            ' '.join(product_details.get('features', [])).lower(),
+            product_details.get('price', 0),
+        )
+
+    def is_b2b_product(self, product_details: Dict) -> bool:
+        """Detect if a product is B2B based on various indicators."""
+        return self._is_b2b_cached(*self._product_fingerprint(product_details))
+
+    def _score_b2b(self, product_name: str, category: str, description: str,
+                   target_audience: str, features: str, price: float) -> bool:
+        """Score lowercased product fields for B2B indicators."""
+        # Check for B2B keywords in all fields
+        all_text = f"{product_name} {category} {description} {target_audience} {features}"
+        
+        # Strong B2B indicators (each distinct keyword scores once)
+        b2b_score = 2 * len(_find_terms(_B2B_KW_AUT, all_text))
+        if b2b_score >= 3:
+            return True
+        
+        # Target audience indicators
+        if _find_terms(_B2B_AUD_AUT, target_audience):
+            return True
+        
+        # Category-based detection
+        if _find_terms(_B2B_CAT_AUT, category):
+            return True
+        
+        # Price-based indicator (higher prices often indicate B2B)
+        if price > 5000:  # Products over ₹5000 might be B2B
+            b2b_score += 1
+        
+        # Return True if B2B score is 3 or higher
+        return b2b_score >= 3
+
+    def _build_discovery_prompt(self, product_details: Dict, is_b2b: bool) -> str:
+        """Build the prompt asking Groq for additional platform recommendations."""
+        return _DISCOVERY_PROMPT_TEMPLATE.format_map({
+            "name": product_details.get('name', ''),
+            "category": product_details.get('category', ''),
+            "product_type": _PRODUCT_TYPES[is_b2b],
+            "target_audience": product_details.get('target_audience', ''),
+            "price": product_details.get('price', 0),
+        })
+
+    def _merge_discovered_platforms(self, product_details: Dict, is_b2b: bool,
+                                    response_text: Optional[str]) -> List[str]:
+        """Combine category matches, Groq recommendations and essential platforms."""
+        category = product_details.get('category', '')
+
+        # Start with the essential platforms for the product type
+        discovered_platforms = set(ESSENTIAL_B2B if is_b2b else ESSENTIAL_B2C)
+        
+        # Add category-specific platforms: check if category matches any specific platform categories
+        for _, platforms in _CATEGORY_AUT.iter(category.lower()):
+            discovered_platforms.update(platforms)
+
+        if response_text:
+            # Parse JSON response - find array brackets
+            start_bracket = response_text.find('[')
+            end_bracket = response_text.rfind(']')
+            
+            if start_bracket != -1 and end_bracket != -1 and end_bracket > start_bracket:
+                json_str = response_text[start_bracket:end_bracket + 1]
+                try:
+                    groq_platforms = orjson.loads(json_str)
+                    discovered_platforms.update(KNOWN_PLATFORM_SET.intersection(groq_platforms))
+                except (orjson.JSONDecodeError, TypeError):
+                    # TypeError covers non-string entries such as nested objects
+                    print("⚠️ Failed to parse platform recommendations from Groq")
+        
+        return list(discovered_platforms)
+
+    def discover_platforms_with_groq(self, product_details: Dict) -> List[str]:
+        """Discover relevant e-commerce platforms using Groq API instead of Google Search."""
+        cache_key = make_cache_key(self._product_fingerprint(product_details))
+        cached_platforms = DISCOVERY_CACHE.get(cache_key)
+        if cached_platforms is not None:
+            return list(cached_platforms)
+
+        # Detect if product is B2B
+        is_b2b = self.is_b2b_product(product_details)
 
+        # Use Groq to get additional platform recommendations
+        response_text = None
         try:
             chat_completion = self.groq_client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an expert e-commerce analyst. Always respond with valid JSON only, no additional text or explanations."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                model="llama-3.1-8b-instant",
-                temperature=0.1,
-                max_tokens=4000,
-                top_p=0.9,
-                stop=None,
-                stream=False,
+                messages=[{"role": "user", "content": self._build_discovery_prompt(product_details, is_b2b)}],
+                **_DISCOVERY_PARAMS,
             )
+            response_text = chat_completion.choices[0].message.content
+        except Exception as e:
+            print(f"⚠️ Groq platform discovery failed: {e}")
+
+        platforms = self._merge_discovered_platforms(product_details, is_b2b, response_text)
+        # Only cache results that include Groq's recommendations
+        if response_text is not None:
+            DISCOVERY_CACHE.set(cache_key, platforms)
+        return platforms
+
+    async def discover_platforms_with_groq_async(self, product_details: Dict) -> List[str]:
+        """Async variant of discover_platforms_with_groq using the AsyncGroq client."""
+        cache_key = make_cache_key(self._product_fingerprint(product_details))
+        cached_platforms = await DISCOVERY_CACHE.aget(cache_key)
+        if cached_platforms is not None:
+            return list(cached_platforms)
+
+        is_b2b = self.is_b2b_product(product_details)
+
+        response_text = None
+        try:
+            chat_completion = await self.async_groq_client.chat.completions.create(
+                messages=[{"role": "user", "content": self._build_discovery_prompt(product_details, is_b2b)}],
+                **_DISCOVERY_PARAMS,
+            )
+            response_text = chat_completion.choices[0].message.content
+        except Exception as e:
+            print(f"⚠️ Groq platform discovery failed: {e}")
+
+        platforms = self._merge_discovered_platforms(product_details, is_b2b, response_text)
+        if response_text is not None:
+            await DISCOVERY_CACHE.aset(cache_key, platforms)
+        return platforms
+
+    def _build_suitability_messages(self, product_details: Dict, platforms: List[str]) -> List[Dict]:
+        """Build the chat messages for the platform suitability analysis."""
+        
+        # Detect if product is B2B
+        is_b2b = self.is_b2b_product(product_details)
+        
+        prompt = _SUITABILITY_PROMPT_HEAD.format_map({
+            "product_json": orjson.dumps(product_details).decode(),
+            "platforms_json": orjson.dumps(platforms).decode(),
+            "product_type": _PRODUCT_TYPES[is_b2b],
+        }) + _SUITABILITY_PROMPT_TAIL
+
+        return [
+            {
+                "role": "system",
+                "content": "You are an expert e-commerce analyst. Always respond with valid JSON only, no additional text or explanations."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+
+    def _build_batch_suitability_messages(self, product_details_list: List[Dict],
+                                          platforms_list: List[List[str]]) -> List[Dict]:
+        """Build one set of chat messages covering several products."""
+        sections = []
+        for index, (product_details, platforms) in enumerate(zip(product_details_list, platforms_list)):
+            is_b2b = self.is_b2b_product(product_details)
+            sections.append(_BATCH_PRODUCT_SECTION_TEMPLATE.format_map({
+                "index": index,
+                "product_json": orjson.dumps(product_details).decode(),
+                "platforms_json": orjson.dumps(platforms).decode(),
+                "product_type": _PRODUCT_TYPES[is_b2b],
+            }))
+
+        prompt = _BATCH_SUITABILITY_PROMPT_HEAD.format_map({
+            "count": len(sections),
+            "products_text": "\n\n".join(sections),
+        }) + _BATCH_SUITABILITY_PROMPT_TAIL
+
+        return [
+            {
+                "role": "system",
+                "content": "You are an expert e-commerce analyst. Always respond with valid JSON only, no additional text or explanations."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+
+    @staticmethod
+    def _suitability_cache_key(product_details: Dict, platforms: List[str]) -> str:
+        """Key a suitability analysis on the product and its platform set."""
+        return make_cache_key({"product": product_details, "platforms": sorted(platforms)})
+
+    @staticmethod
+    def _get_cached_analysis(cache_key: str) -> Optional[AnalysisResponse]:
+        """Return a cached suitability analysis, or None on a miss."""
+        cached_analysis = SUITABILITY_CACHE.get(cache_key)
+        if cached_analysis is None:
+            return None
+        return msgspec.convert(cached_analysis, AnalysisResponse)
+
+    @staticmethod
+    def _cache_analysis(cache_key: str, analysis: AnalysisResponse, platforms: List[str]):
+        """Cache a suitability analysis if the model produced a complete one."""
+        if _is_complete_analysis(analysis, platforms):
+            SUITABILITY_CACHE.set(cache_key, msgspec.to_builtins(analysis))
+
+    @staticmethod
+    async def _aget_cached_analysis(cache_key: str) -> Optional[AnalysisResponse]:
+        """Async variant of _get_cached_analysis for the event loop."""
+        cached_analysis = await SUITABILITY_CACHE.aget(cache_key)
+        if cached_analysis is None:
+            return None
+        return msgspec.convert(cached_analysis, AnalysisResponse)
+
+    @staticmethod
+    async def _acache_analysis(cache_key: str, analysis: AnalysisResponse, platforms: List[str]):
+        """Async variant of _cache_analysis for the event loop."""
+        if _is_complete_analysis(analysis, platforms):
+            await SUITABILITY_CACHE.aset(cache_key, msgspec.to_builtins(analysis))
+
+    def analyze_platform_suitability(self, product_details: Dict, platforms: List[str]) -> AnalysisResponse:
+        """Use Groq API to analyze and rank platforms by suitability."""
+        cache_key = self._suitability_cache_key(product_details, platforms)
+        cached_analysis = self._get_cached_analysis(cache_key)
+        if cached_analysis is not None:
+            return cached_analysis
+
+        try:
+            stream = self.groq_client.chat.completions.create(
+                messages=self._build_suitability_messages(product_details, platforms),
+                stream=True,
+                **_SUITABILITY_PARAMS,
+            )
+
+            # Decode each top-level member while the rest is still streaming
+            parser = IncrementalJsonParser()
+            members = {}
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    members.update(parser.feed(content))
+            analysis = self._finish_streamed_analysis(parser, members)
+            self._cache_analysis(cache_key, analysis, platforms)
+            return analysis
             
-            response_text = chat_completion.choices[0].message.content.strip()
-            return self.parse_platform_analysis(response_text)
-            
         except Exception as e:
             print(f"Groq API error: {e}")
-            return {"error": f"Analysis failed: {str(e)}"}
+            return AnalysisResponse()
+
+    async def analyze_platform_suitability_async(self, product_details: Dict, platforms: List[str],
+                                                 max_tokens: Optional[int] = None) -> AnalysisResponse:
+        """Async variant of analyze_platform_suitability using the AsyncGroq client."""
+        cache_key = self._suitability_cache_key(product_details, platforms)
+        cached_analysis = await self._aget_cached_analysis(cache_key)
+        if cached_analysis is not None:
+            return cached_analysis
+
+        params = _SUITABILITY_PARAMS if max_tokens is None else {**_SUITABILITY_PARAMS, "max_tokens": max_tokens}
+        try:
+            stream = await self.async_groq_client.chat.completions.create(
+                messages=self._build_suitability_messages(product_details, platforms),
+                stream=True,
+                **params,
+            )
+
+            parser = IncrementalJsonParser()
+            members = {}
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    members.update(parser.feed(content))
+            analysis = self._finish_streamed_analysis(parser, members)
+            await self._acache_analysis(cache_key, analysis, platforms)
+            return analysis
+
+        except Exception as e:
+            print(f"Groq API error: {e}")
+            return AnalysisResponse()
+
+    async def stream_product_analysis(self, product_details: Dict):
+        """
+        Async generator of (event, data) pairs for a streamed product analysis.
+
+        Yields the discovered platforms first, then one "platform" row per
+        platform in rank order, then the overall recommendations.
+        """
+        platforms = await self.discover_platforms_with_groq_async(product_details)
+        yield "platforms_discovered", platforms
+
+        cache_key = self._suitability_cache_key(product_details, platforms)
+        analysis = await self._aget_cached_analysis(cache_key)
+        sent_platforms = False
 
-    def parse_platform_analysis(self, text: str) -> Dict:
-        """Parse JSON response from Groq API."""
+        if analysis is None:
+            parser = IncrementalJsonParser()
+            members = {}
+            try:
+                stream = await self.async_groq_client.chat.completions.create(
+                    messages=self._build_suitability_messages(product_details, platforms),
+                    stream=True,
+                    **_SUITABILITY_PARAMS,
+                )
+
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    content = chunk.choices[0].delta.content
+                    if not content:
+                        continue
+                    for field, value in parser.feed(content):
+                        members[field] = value
+                        if field != "platform_analysis":
+                            continue
+                        # Send the ranked rows without waiting for the recommendations
+                        try:
+                            partial = msgspec.convert({field: value}, AnalysisResponse, strict=False)
+                        except msgspec.ValidationError:
+                            continue
+                        sent_platforms = True
+                        for row in self.build_results(platforms, partial)["platforms"]:
+                            yield "platform", row
+
+            except Exception as e:
+                print(f"Groq API error: {e}")
+
+            analysis = self._finish_streamed_analysis(parser, members)
+            await self._acache_analysis(cache_key, analysis, platforms)
+
+        if not sent_platforms:
+            for row in self.build_results(platforms, analysis)["platforms"]:
+                yield "platform", row
+        yield "overall_recommendations", analysis.overall_recommendations
+
+    def _finish_streamed_analysis(self, parser: IncrementalJsonParser, members: Dict) -> AnalysisResponse:
+        """Build the analysis from streamed members, or reparse the full text."""
+        if parser.done and "platform_analysis" in members:
+            try:
+                return msgspec.convert(members, AnalysisResponse, strict=False)
+            except msgspec.ValidationError:
+                pass
+        # Members that failed to decode (e.g. trailing commas) are dropped by
+        # the parser, so malformed output goes through the repair path
+        return self.parse_platform_analysis(parser.text)
+
+    def parse_platform_analysis(self, text: str, response_type: type = AnalysisResponse):
+        """Decode the Groq response into the fields analyze_product uses."""
         if not text.strip():
-            return {}
+            return response_type()
         
         # Remove markdown code blocks if present
-        text = re.sub(r'```json\s*', '', text, flags=re.IGNORECASE)
-        text = re.sub(r'```\s*', '', text)
+        text = _JSON_FENCE_RE.sub('', text)
+        text = _CODE_FENCE_RE.sub('', text)
     
-    # Find JSON object - look for balanced braces
         start_idx = text.find('{')
         if start_idx == -1:
             print("⚠️ No JSON object found in response")
-            return {}
-        
+            return response_type()
+
+        # Fast path: the outermost braces usually delimit valid JSON, so let
+        # the C decoder validate it instead of walking it in Python
+        end_idx = text.rfind('}')
+        if end_idx > start_idx:
+            try:
+                return msgspec.json.decode(text[start_idx:end_idx + 1], type=response_type, strict=False)
+            except msgspec.DecodeError:
+                pass
+
+        # Fallback: find the balanced JSON object and repair common issues
         brace_count = 0
         end_idx = start_idx
         
@@ -347,75 +867,210 @@ Return JSON only:
         
         if brace_count != 0:
             print("⚠️ Unbalanced braces in JSON")
-            return {}
+            return response_type()
         
         json_str = text[start_idx:end_idx + 1]
         
         # Clean up common JSON issues
-        json_str = re.sub(r',(\s*[}\]])', r'\1', json_str)  # Remove trailing commas
-        json_str = re.sub(r'\n\s*', ' ', json_str)  # Remove extra whitespace
+        json_str = _TRAILING_COMMA_RE.sub(r'\1', json_str)  # Remove trailing commas
+        json_str = _NEWLINE_WS_RE.sub(' ', json_str)  # Remove extra whitespace
         
         try:
-            return json.loads(json_str)
-        except json.JSONDecodeError as e:
+            return msgspec.json.decode(json_str, type=response_type, strict=False)
+        except msgspec.DecodeError as e:
             print(f"⚠️ JSON parse failed: {e}")
             print(f"Problematic JSON: {json_str[:200]}...")
-            return {}
+            return response_type()
 
     def analyze_product(self, product_details: Dict) -> Dict:
         """Run the full product analysis pipeline and return ranked results."""
         platforms = self.discover_platforms_with_groq(product_details)
         analysis = self.analyze_platform_suitability(product_details, platforms)
+        return self.build_results(platforms, analysis)
+
+    async def analyze_product_async(self, product_details: Dict) -> Dict:
+        """Async variant of analyze_product, for running many products concurrently."""
+        if await DISCOVERY_CACHE.aget(make_cache_key(self._product_fingerprint(product_details))) is not None:
+            # Discovery is free on a cache hit, so a single analysis call is enough
+            platforms = await self.discover_platforms_with_groq_async(product_details)
+            analysis = await self.analyze_platform_suitability_async(product_details, platforms)
+            return self.build_results(platforms, analysis)
+
+        # Essential and category platforms are known without Groq, so analyze
+        # them while discovery is still running
+        is_b2b = self.is_b2b_product(product_details)
+        local_platforms = self._merge_discovered_platforms(product_details, is_b2b, None)
+        platforms, analysis = await asyncio.gather(
+            self.discover_platforms_with_groq_async(product_details),
+            self.analyze_platform_suitability_async(product_details, local_platforms),
+        )
+
+        # Then analyze only the platforms that discovery added, with a budget
+        # sized for them rather than for a full platform list
+        local_set = set(local_platforms)
+        extra_platforms = [p for p in platforms if p not in local_set]
+        if extra_platforms:
+            max_tokens = min(_SUITABILITY_PARAMS["max_tokens"],
+                             _RECOMMENDATIONS_TOKENS + _TOKENS_PER_PLATFORM * len(extra_platforms))
+            extra_analysis = await self.analyze_platform_suitability_async(
+                product_details, extra_platforms, max_tokens=max_tokens
+            )
+            both_succeeded = (set(local_platforms) <= analysis.platform_analysis.keys()
+                              and set(extra_platforms) <= extra_analysis.platform_analysis.keys())
+            analysis = self._merge_analyses(analysis, extra_analysis)
+            # Stored under the full platform list, which is what a repeat request
+            # looks up; a merge missing either half is served once but not cached
+            if both_succeeded:
+                await self._acache_analysis(self._suitability_cache_key(product_details, platforms),
+                                            analysis, platforms)
+
+        return self.build_results(platforms, analysis)
+
+    @staticmethod
+    def _merge_analyses(base: AnalysisResponse, extra: AnalysisResponse) -> AnalysisResponse:
+        """Combine two partial analyses, re-ranking every platform by score."""
+        # Each call ranks its own platforms from 1, so ranks are only
+        # comparable after re-deriving them from the 0-100 scores
+        platform_analysis = {**extra.platform_analysis, **base.platform_analysis}
+        ordered = sorted(platform_analysis.items(), key=lambda item: (-item[1].score, item[1].rank))
+        # The base call never saw the discovered platforms, so its top 3 is
+        # re-derived from the merged ranking to keep the two consistent
+        overall_recommendations = dict(base.overall_recommendations or extra.overall_recommendations)
+        overall_recommendations["top_3_platforms"] = [platform for platform, _ in ordered[:3]]
+        return AnalysisResponse(
+            platform_analysis={
+                platform: msgspec.structs.replace(info, rank=rank)
+                for rank, (platform, info) in enumerate(ordered, start=1)
+            },
+            overall_recommendations=overall_recommendations,
+        )
+
+    def analyze_products_batch(self, product_details_list: List[Dict]) -> List[Dict]:
+        """Analyze several products with a single shared suitability call."""
+        # Identical products are discovered and analyzed only once
+        product_keys = [make_cache_key(p) for p in product_details_list]
+        unique_products = dict(zip(product_keys, product_details_list))
+        unique_results = dict(zip(unique_products,
+                                  self._analyze_unique_products(list(unique_products.values()))))
+        return [unique_results[key] for key in product_keys]
+
+    def _analyze_unique_products(self, product_details_list: List[Dict]) -> List[Dict]:
+        """Batch-analyze products that are already known to be distinct."""
+        platforms_list = [self.discover_platforms_with_groq(p) for p in product_details_list]
+        cache_keys = [self._suitability_cache_key(p, platforms)
+                      for p, platforms in zip(product_details_list, platforms_list)]
 
+        analyses = {}
+        for index, cache_key in enumerate(cache_keys):
+            cached_analysis = self._get_cached_analysis(cache_key)
+            if cached_analysis is not None:
+                analyses[index] = cached_analysis
+
+        # Only products without a cached analysis go into the batched prompt
+        pending = [index for index in range(len(product_details_list)) if index not in analyses]
+        if pending:
+            params = dict(_SUITABILITY_PARAMS, stream=False)
+            params["max_tokens"] = min(params["max_tokens"] * len(pending), _BATCH_MAX_TOKENS)
+
+            try:
+                chat_completion = self.groq_client.chat.completions.create(
+                    messages=self._build_batch_suitability_messages(
+                        [product_details_list[index] for index in pending],
+                        [platforms_list[index] for index in pending],
+                    ),
+                    **params,
+                )
+
+                response_text = chat_completion.choices[0].message.content.strip()
+                batch = self.parse_platform_analysis(response_text, BatchAnalysisResponse)
+                for result in batch.results:
+                    if 0 <= result.product_index < len(pending):
+                        index = pending[result.product_index]
+                        analyses[index] = result
+                        self._cache_analysis(cache_keys[index], result, platforms_list[index])
+
+            except Exception as e:
+                print(f"Groq API error: {e}")
+
+        results = []
+        for index, (product_details, platforms) in enumerate(zip(product_details_list, platforms_list)):
+            analysis = analyses.get(index)
+            if analysis is None:
+                # The batch missed this product (e.g. truncated output), so ask for it alone
+                analysis = self.analyze_platform_suitability(product_details, platforms)
+            results.append(self.build_results(platforms, analysis))
+
+        return results
+
+    def build_results(self, platforms: List[str], analysis: AnalysisResponse) -> Dict:
+        """Combine discovered platforms with their analysis into ranked results."""
         platforms_list = []
 
         for platform in platforms:
-            info = analysis.get("platform_analysis", {}).get(platform, {})
+            info = analysis.platform_analysis.get(platform, _EMPTY_PLATFORM)
+            # PlatformInfo fields are declared in output order
             platforms_list.append({
                 "name": platform,
-                "homepage": self.known_platforms.get(platform, ""),
-                "rank": int(info.get("rank", 999)),
-                "score": float(info.get("score", 0)),
-                "reasoning": info.get("reasoning", ""),
-                "gst_taxes": info.get("gst_taxes", "Unknown"),
-                "other_charges": info.get("other_charges", "Unknown"),
-                "profit": info.get("profit_analysis", "Unknown"),
-                "final_selling_charge": info.get("final_selling_charge", "Unknown"),
-                "commission_fees": info.get("commission_fees", "Unknown"),
-                "advantages": info.get("advantages", []),
-                "disadvantages": info.get("disadvantages", []),
-                "target_audience_match": info.get("target_audience_match", "Unknown"),
-                "category_fit": info.get("category_fit", "Unknown"),
-                "competition_level": info.get("competition_level", "Unknown"),
-                "business_model": info.get("business_model", "Unknown"),
-                "bulk_order_benefits": info.get("bulk_order_benefits", ""),
-                "verification_standards": info.get("verification_standards", ""),
-                "recommended_strategy": info.get("recommended_strategy", "")
+                "homepage": KNOWN_PLATFORMS.get(platform, ""),
+                **msgspec.structs.asdict(info),
             })
 
-        platforms_list.sort(key=lambda x: x["rank"])
+        platforms_list.sort(key=operator.itemgetter("rank"))
 
         final_results = {
             "platforms": platforms_list,
-            "overall_recommendations": analysis.get("overall_recommendations", {})
+            "overall_recommendations": analysis.overall_recommendations
         }
 
         return final_results
 
 
-def main(product_data: Dict, groq_api_key: str) -> str:
+def main(product_data: Union[Dict, List[Dict]], groq_api_key: str) -> str:
     """
     Main function to analyze product and return JSON results.
+
+    A list of products is analyzed with one batched suitability call and
+    returns a JSON array of results in the same order.
     """
     try:
         analyzer = EcommercePlatformAnalyzer(groq_api_key=groq_api_key)
-        results = analyzer.analyze_product(product_data)
-        return json.dumps(results, indent=2, ensure_ascii=False)
+        if isinstance(product_data, list):
+            results = analyzer.analyze_products_batch(product_data)
+        else:
+            results = analyzer.analyze_product(product_data)
+        return orjson.dumps(results, option=orjson.OPT_INDENT_2).decode()
     except Exception as e:
         print(f"⚠️ Error in main: {e}")
         return "{}"
 
 
+async def main_batch(products: List[Dict], groq_api_key: str) -> List[Dict]:
+    """
+    Analyze several products concurrently and return their results in order.
+    """
+    # The batch runs in its own event loop, so it gets a private connection
+    # pool that is closed with it; closing the shared pool would break every
+    # module-level client in the process
+    from groq_http import create_async_http_client
+
+    async with create_async_groq_client(groq_api_key, create_async_http_client()) as async_client:
+        analyzer = EcommercePlatformAnalyzer(groq_api_key=groq_api_key, async_groq_client=async_client)
+        semaphore = asyncio.Semaphore(_MAX_CONCURRENT_ANALYSES)
+
+        async def analyze(product_details: Dict) -> Dict:
+            # A slot is released as soon as its product finishes, so the
+            # next one starts immediately instead of waiting for a full wave
+            async with semaphore:
+                return await analyzer.analyze_product_async(product_details)
+
+        # Identical products are analyzed only once
+        product_keys = [make_cache_key(p) for p in products]
+        unique_products = dict(zip(product_keys, products))
+        results = await asyncio.gather(*(analyze(p) for p in unique_products.values()))
+        unique_results = dict(zip(unique_products, results))
+        return [unique_results[key] for key in product_keys]
+
+
 if __name__ == "__main__":
     # Sample B2C product data
     sample_data_b2c = {
@@ -462,18 +1117,19 @@ if __name__ == "__main__":
         "description": "Professional grade paper shredder for secure document destruction in offices"
     }
 
-    api_key = GROQ_API_KEY
+    api_key = _load_api_key()
+
+    analysis1, analysis2, analysis3 = asyncio.run(
+        main_batch([sample_data_b2c, sample_data_b2b, sample_data_office], api_key)
+    )
     
     print("=== B2C PRODUCT ANALYSIS (Cotton Shirt) ===")
-    analysis1 = main(sample_data_b2c, api_key)
-    print(analysis1)
+    print(orjson.dumps(analysis1, option=orjson.OPT_INDENT_2).decode())
     
     print("\n=== B2B PRODUCT ANALYSIS (Safety Helmets) ===")
-    analysis2 = main(sample_data_b2b, api_key)
-    print(analysis2)
+    print(orjson.dumps(analysis2, option=orjson.OPT_INDENT_2).decode())
     
     print("\n=== B2B PRODUCT ANALYSIS (Office Equipment) ===")
-    analysis3 = main(sample_data_office, api_key)
-    print(analysis3)
+    print(orjson.dumps(analysis3, option=orjson.OPT_INDENT_2).decode())
 
 
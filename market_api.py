@@ -1,31 +1,37 @@
 # market_api_v2.py
 
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import List
+from typing import List, Optional
 from dotenv import load_dotenv
+import orjson
 import os
-import json
-from market import main as analyze_product_main  # import main() from market.py
+import secrets
+from market import DISCOVERY_CACHE, SUITABILITY_CACHE, EcommercePlatformAnalyzer, create_async_groq_client
 
 # Load environment variables
 load_dotenv()
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
-app = FastAPI(
-    title="E-commerce Platform Analyzer API",
-    description="Analyze product suitability across Indian e-commerce platforms.",
-    version="1.0.0"
-)
+# Required in the X-Admin-Token header by /cache/invalidate; unset disables the route
+CACHE_ADMIN_TOKEN = os.getenv("CACHE_ADMIN_TOKEN")
 
-# Enable CORS (open - tighten in production)
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# One async client per process; requests await Groq instead of blocking the event loop
+GROQ_CLIENT = create_async_groq_client(GROQ_API_KEY) if GROQ_API_KEY else None
+
+# Shared by all requests so the clients and the B2B detection cache are reused
+ANALYZER = EcommercePlatformAnalyzer(groq_api_key=GROQ_API_KEY, async_groq_client=GROQ_CLIENT) if GROQ_CLIENT else None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    if GROQ_CLIENT is not None:
+        await GROQ_CLIENT.close()
+
+router = APIRouter(default_response_class=ORJSONResponse)
 
 # ---------- Request & Response Models ----------
 
@@ -62,29 +68,45 @@ class AnalysisResponse(BaseModel):
     platforms: List[PlatformAnalysis]
     overall_recommendations: OverallRecommendations
 
+def sse_event(event: str, data) -> bytes:
+    """Encode one server-sent event with a JSON payload."""
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
 # ---------- API Routes ----------
 
-@app.get("/")
-def root():
-    return {
-        "message": "E-commerce Platform Analyzer API is running",
-        "endpoints": {
-            "analyze_product": {
-                "path": "/analyze-product",
-                "method": "POST",
-                "description": "Analyze a product and recommend suitable e-commerce platforms"
-            }
+# The service description never changes, so it is encoded once at import
+_ROOT_BYTES = orjson.dumps({
+    "message": "E-commerce Platform Analyzer API is running",
+    "endpoints": {
+        "analyze_product": {
+            "path": "/analyze-product",
+            "method": "POST",
+            "description": "Analyze a product and recommend suitable e-commerce platforms"
+        },
+        "stream_analyze_product": {
+            "path": "/analyze-product/stream",
+            "method": "POST",
+            "description": "Same as analyze_product, streamed as server-sent events",
+            "response": "text/event-stream; platforms_discovered, then one platform event per ranked platform, then overall_recommendations"
+        },
+        "invalidate_cache": {
+            "path": "/cache/invalidate",
+            "method": "POST",
+            "description": "Clear cached platform discovery and suitability results (requires X-Admin-Token; other workers catch up within 5 minutes)"
         }
     }
+})
+
+@router.get("/")
+async def root():
+    return Response(_ROOT_BYTES, media_type="application/json")
 
-@app.post("/analyze-product", response_model=AnalysisResponse)
+@router.post("/analyze-product", response_model=AnalysisResponse)
 async def analyze_product_api(product: ProductDetails):
     """
     Analyze a product and recommend the most suitable e-commerce platforms.
     """
-    GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-
-    if not GROQ_API_KEY:
+    if ANALYZER is None:
         raise HTTPException(
             status_code=500,
             detail="GROQ_API_KEY must be set in environment."
@@ -92,10 +114,64 @@ async def analyze_product_api(product: ProductDetails):
 
     try:
         product_dict = product.model_dump()
-        result_json = analyze_product_main(product_dict, GROQ_API_KEY)
-        result_dict = json.loads(result_json)
+        result_dict = await ANALYZER.analyze_product_async(product_dict)
         return AnalysisResponse(**result_dict)
-    except json.JSONDecodeError as e:
-        raise HTTPException(status_code=500, detail=f"Failed to parse analysis response: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Product analysis failed: {str(e)}")
+
+@router.post("/analyze-product/stream")
+async def stream_analyze_product_api(product: ProductDetails):
+    """
+    Stream a product analysis as server-sent events.
+
+    The discovered platforms are sent as soon as discovery finishes, so
+    clients can render them while the suitability analysis is generated.
+    """
+    if ANALYZER is None:
+        raise HTTPException(
+            status_code=500,
+            detail="GROQ_API_KEY must be set in environment."
+        )
+
+    async def events():
+        async for event, data in ANALYZER.stream_product_analysis(product.model_dump()):
+            yield sse_event(event, data)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@router.post("/cache/invalidate")
+async def invalidate_cache(x_admin_token: Optional[str] = Header(None)):
+    """
+    Clear cached platform discovery and suitability results.
+
+    Clears Redis and this worker's in-process cache only; other workers
+    drop their local copies when the local TTL expires (5 minutes at most).
+    """
+    if not CACHE_ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, CACHE_ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+    await DISCOVERY_CACHE.aclear()
+    await SUITABILITY_CACHE.aclear()
+    return {"status": "cleared"}
+
+# Standalone app for running this service on its own; server.py includes the router instead
+app = FastAPI(
+    title="E-commerce Platform Analyzer API",
+    description="Analyze product suitability across Indian e-commerce platforms.",
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
+)
+
+# Enable CORS (open - tighten in production)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+app.include_router(router)
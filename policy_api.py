@@ -1,18 +1,32 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 from typing import List, Dict, Union
-import json
+from datetime import datetime
+import orjson
 import os
 from dotenv import load_dotenv
-from policy_generator import main as generate_policies_main
+from groq import AsyncGroq
+from groq_http import shared_async_http_client
+from policy_generator import PolicyGenerateRequest as GeneratorRequest, generate_policies, policy_models, stream_policies, structure_policies
 
 # Load environment variables
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
-app = FastAPI(title="Policy Generator API")
+# One client per process so connections to the Groq API are reused across requests
+GROQ_CLIENT = AsyncGroq(api_key=GROQ_API_KEY, http_client=shared_async_http_client()) if GROQ_API_KEY else None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    if GROQ_CLIENT is not None:
+        await GROQ_CLIENT.close()
+
+app = FastAPI(title="Policy Generator API", default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # Allow CORS (you can restrict origins in production)
 app.add_middleware(
@@ -48,6 +62,19 @@ class PolicyGenerateRequest(BaseModel):
     language: str = "en"
     strict_compliance: bool = True
 
+def sse_event(event: str, data) -> bytes:
+    """Encode one server-sent event with a JSON payload."""
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+def to_generator_request(request: PolicyGenerateRequest) -> GeneratorRequest:
+    """Validate the request against the generator's stricter model, as a 422 on failure."""
+    try:
+        return GeneratorRequest(**request.model_dump())
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)]
+        )
+
 # ---------- API Endpoint ----------
 
 @app.post("/generate-policies")
@@ -56,60 +83,96 @@ async def generate_policies_api(request: PolicyGenerateRequest):
     Generate legal policies (privacy, terms, refund, cookie, etc.)
     based on business details and compliance requirements.
     """
-    if not GROQ_API_KEY:
+    if GROQ_CLIENT is None:
         raise HTTPException(status_code=500, detail="GROQ_API_KEY not set in environment.")
 
+    generator_request = to_generator_request(request)
+
     try:
         print("Starting policy generation...")
-        result_json = generate_policies_main(request.dict(), GROQ_API_KEY)
-        print(f"Policy generation result: {result_json}")
+        # Build the result as a dict; ORJSONResponse serializes it once
+        raw_result = await generate_policies(generator_request, GROQ_CLIENT)
+        result_dict = structure_policies(raw_result)
+        print(f"Policy generation result: {result_dict}")
 
-        # Parse back into dict for FastAPI response
-        result_dict = json.loads(result_json)
-        return JSONResponse(content=result_dict)
+        return result_dict
 
-    except json.JSONDecodeError as e:
-        raise HTTPException(status_code=500, detail=f"Failed to parse policy response: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Policy generation failed: {str(e)}")
 
-@app.get("/")
-def root():
-    return {
-        "message": "Policy Generator API. Submit business details to generate legal policies.",
-        "endpoints": {
-            "generate_policies": {
-                "path": "/generate-policies",
-                "method": "POST",
-                "description": "Generate privacy policy, terms, refund, cookie policy etc.",
-                "request_example": {
-                    "business_details": {
-                        "business_name": "TechNova Solutions",
-                        "business_type": "saas",
-                        "industry": "Software",
-                        "location_country": "India",
-                        "location_state": "Delhi",
-                        "location_city": "New Delhi",
-                        "website_url": "https://technova.example",
-                        "has_online_presence": True,
-                        "processes_payments": True,
-                        "uses_cookies": True,
-                        "has_newsletter": True,
-                        "target_audience": "B2B",
-                        "data_retention_period": 730
-                    },
-                    "policy_types": ["privacy_policy", "terms_conditions", "refund_policy", "cookie_policy"],
-                    "language": "en",
-                    "strict_compliance": True
+@app.post("/generate-policies/stream")
+async def stream_policies_api(request: PolicyGenerateRequest):
+    """
+    Stream generated policies as server-sent events.
+
+    Each policy is sent as a `policy` event as soon as it is ready, with its
+    type in the data; the last `done` event carries the timestamp and the
+    model used for each policy type.
+    """
+    if GROQ_CLIENT is None:
+        raise HTTPException(status_code=500, detail="GROQ_API_KEY not set in environment.")
+
+    generator_request = to_generator_request(request)
+
+    async def events():
+        # The event name is fixed: policy types come from the client and could
+        # otherwise inject SSE fields through embedded newlines
+        async for ptype, policy_json in stream_policies(generator_request, GROQ_CLIENT):
+            yield sse_event("policy", {"policy_type": ptype, "policy": policy_json})
+        yield sse_event("done", {
+            "timestamp": datetime.now().isoformat(),
+            "api_model": policy_models(generator_request.policy_types)
+        })
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+# The service description never changes, so it is encoded once at import
+_ROOT_BYTES = orjson.dumps({
+    "message": "Policy Generator API. Submit business details to generate legal policies.",
+    "endpoints": {
+        "generate_policies": {
+            "path": "/generate-policies",
+            "method": "POST",
+            "description": "Generate privacy policy, terms, refund, cookie policy etc.",
+            "request_example": {
+                "business_details": {
+                    "business_name": "TechNova Solutions",
+                    "business_type": "saas",
+                    "industry": "Software",
+                    "location_country": "India",
+                    "location_state": "Delhi",
+                    "location_city": "New Delhi",
+                    "website_url": "https://technova.example",
+                    "has_online_presence": True,
+                    "processes_payments": True,
+                    "uses_cookies": True,
+                    "has_newsletter": True,
+                    "target_audience": "B2B",
+                    "data_retention_period": 730
+                },
+                "policy_types": ["privacy_policy", "terms_conditions", "refund_policy", "cookie_policy"],
+                "language": "en",
+                "strict_compliance": True
+            },
+            "response": {
+                "generated_policies": {
+                    "privacy_policy": {"policy_type": "privacy_policy", "content": "string"},
+                    "terms_conditions": {"policy_type": "terms_conditions", "content": "string"}
                 },
-                "response": {
-                    "generated_policies": {
-                        "privacy_policy": {"policy_type": "privacy_policy", "content": "string"},
-                        "terms_conditions": {"policy_type": "terms_conditions", "content": "string"}
-                    },
-                    "timestamp": "string",
-                    "api_model": "string"
-                }
+                "timestamp": "string",
+                "api_model": {"privacy_policy": "string", "terms_conditions": "string"}
             }
+        },
+        "stream_policies": {
+            "path": "/generate-policies/stream",
+            "method": "POST",
+            "description": "Same as generate_policies, streamed as server-sent events per policy",
+            "request": "same as generate_policies",
+            "response": "text/event-stream; one policy event per policy type in completion order, then done"
         }
     }
+})
+
+@app.get("/")
+async def root():
+    return Response(_ROOT_BYTES, media_type="application/json")
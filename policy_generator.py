@@ -4,19 +4,45 @@ AI-Powered Privacy & Legal Policy Generator for MSMEs
 Uses Groq API (LLaMA models) to generate customized legal policies
 """
 
-import json
-import re
+import asyncio
+import functools
+import orjson
+import random
 from typing import Dict, List, Union
 from pydantic import BaseModel, Field
 from datetime import datetime
 from dotenv import load_dotenv
 import os
-from groq import Groq
+from groq import APIConnectionError, APIStatusError, AsyncGroq, InternalServerError, RateLimitError
+from json_stream import extract_json_span
+from llm_cache import ResponseCache, make_cache_key
+from rate_limit import reserve_groq_tokens
 
 # Load API key
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
+# Generated policies are stable for identical inputs, so keep them for a week
+POLICY_CACHE = ResponseCache("policy", ttl=604_800)
+
+# Legally dense policies keep the larger models; boilerplate-heavy ones use the fast 8B model
+POLICY_MODEL_MAP = {
+    "privacy_policy": "llama-3.3-70b-versatile",
+    "terms_conditions": "meta-llama/llama-4-scout-17b-16e-instruct",
+    "cookie_policy": "llama-3.1-8b-instant",
+    "refund_policy": "llama-3.1-8b-instant",
+    "employee_policy": "llama-3.1-8b-instant",
+}
+DEFAULT_POLICY_MODEL = "llama-3.1-8b-instant"
+
+
+def policy_models(policy_types: List[str]) -> Dict[str, str]:
+    """Map each requested policy type to the model that generates it."""
+    return {ptype: POLICY_MODEL_MAP.get(ptype, DEFAULT_POLICY_MODEL) for ptype in policy_types}
+
+# Bump whenever SYSTEM_PROMPT or the user prompt changes to retire cached policies
+POLICY_PROMPT_VERSION = "v3"
+
 # ---------- Input Models ----------
 
 class BusinessDetails(BaseModel):
@@ -44,58 +70,61 @@ class PolicyGenerateRequest(BaseModel):
 
 # ---------- Compliance Detection ----------
 
-def determine_compliance_regions(country: str) -> List[str]:
+_INDIA_COUNTRIES = frozenset({'india', 'in'})
+_GDPR_COUNTRIES = frozenset({
+    'germany','france','italy','spain','netherlands','belgium','austria','poland',
+    'czech republic','hungary','romania','bulgaria','croatia','slovakia','slovenia',
+    'estonia','latvia','lithuania','luxembourg','malta','cyprus','denmark','sweden',
+    'finland','ireland','portugal','greece'
+})
+_US_COUNTRIES = frozenset({'united states','usa','us'})
+_CANADA_COUNTRIES = frozenset({'canada','ca'})
+_UK_COUNTRIES = frozenset({'united kingdom','uk','gb'})
+_AUSTRALIA_COUNTRIES = frozenset({'australia','au'})
+
+@functools.lru_cache(maxsize=256)
+def _compliance_regions(country: str) -> tuple:
     regions = []
-    if country.lower() in ['india', 'in']:
+    if country in _INDIA_COUNTRIES:
         regions.extend(['Indian_IT_Act', 'Indian_Consumer_Protection_Act'])
-    if country.lower() in [
-        'germany','france','italy','spain','netherlands','belgium','austria','poland',
-        'czech republic','hungary','romania','bulgaria','croatia','slovakia','slovenia',
-        'estonia','latvia','lithuania','luxembourg','malta','cyprus','denmark','sweden',
-        'finland','ireland','portugal','greece'
-    ]:
+    if country in _GDPR_COUNTRIES:
         regions.append('GDPR')
-    if country.lower() in ['united states','usa','us']:
+    if country in _US_COUNTRIES:
         regions.extend(['CCPA','COPPA','US_FTC'])
-    if country.lower() in ['canada','ca']:
+    if country in _CANADA_COUNTRIES:
         regions.append('PIPEDA')
-    if country.lower() in ['united kingdom','uk','gb']:
+    if country in _UK_COUNTRIES:
         regions.extend(['UK_GDPR','UK_DPA'])
-    if country.lower() in ['australia','au']:
+    if country in _AUSTRALIA_COUNTRIES:
         regions.append('Australian_Privacy_Act')
     if not regions:
         regions.append('International_Best_Practices')
-    return regions
+    return tuple(regions)
+
+def determine_compliance_regions(country: str) -> List[str]:
+    # The cached tuple is copied so callers can't mutate the shared entry
+    return list(_compliance_regions(country.lower()))
 
 # ---------- Regex JSON Extractor ----------
 
 def extract_json_block(text: str) -> str:
     """
-    Extract the first JSON object from a string using regex.
-    Falls back to the raw text if no braces found.
+    Extract the first balanced JSON object from a string.
+    Falls back to the raw text if no complete object is found.
     """
-    match = re.search(r"\{.*\}", text, re.DOTALL)
-    if match:
-        return match.group(0)
+    json_str = extract_json_span(text, "{")
+    if json_str is not None:
+        return json_str
     return text.strip()
 
 # ---------- Groq-powered Policy Generation ----------
 
-SYSTEM_PROMPT = """
-You are a legal compliance and policy drafting assistant.
-Output ONLY valid JSON.
-Do NOT wrap it in markdown code fences (no ```json ... ```).
-Do NOT add explanations or text outside the JSON.
-The JSON must follow this schema:
-
-{
-  "policy_type": "<string, e.g., privacy_policy>",
-  "content": "<policy text as a single string, escape newlines with \\n>"
-}
+SYSTEM_PROMPT = """You draft legal compliance policies. Output ONLY this JSON object, no markdown or prose:
+{"policy_type": "<e.g. privacy_policy>", "content": "<full policy text, newlines escaped as \\n>"}
 """
 
-def call_groq_for_policy(
-    business: BusinessDetails,
+async def call_groq_for_policy(
+    business_json: str,
     policy_type: str,
     language: str,
     compliance_regions: List[str],
@@ -103,6 +132,20 @@ def call_groq_for_policy(
     groq_client,
     max_retries: int = 2
 ) -> Dict:
+    model = POLICY_MODEL_MAP.get(policy_type, DEFAULT_POLICY_MODEL)
+    cache_key = make_cache_key({
+        "prompt_version": POLICY_PROMPT_VERSION,
+        "model": model,
+        "business": business_json,
+        "policy_type": policy_type,
+        "language": language,
+        "compliance_regions": compliance_regions,
+        "strict_compliance": strict_compliance,
+    })
+    cached_policy = await POLICY_CACHE.aget(cache_key)
+    if cached_policy is not None:
+        return cached_policy
+
     compliance_text = (
         f"Ensure compliance with these frameworks: {', '.join(compliance_regions)}"
         if strict_compliance else
@@ -111,21 +154,29 @@ def call_groq_for_policy(
 
     prompt = f"""
 Business Details:
-{json.dumps(business.model_dump(), indent=2)}
+{business_json}
 
 Generate a comprehensive {policy_type.replace("_", " ")} in {language}.
 {compliance_text}
 """
 
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+    # The loop below owns retries (with backoff and temperature bumps), so the
+    # SDK's own retries are turned off rather than multiplied with it
+    groq_client = groq_client.with_options(max_retries=0)
+
+    temperature = 0.3
     for attempt in range(max_retries + 1):
         try:
-            chat_completion = groq_client.chat.completions.create(
-                model="meta-llama/llama-4-scout-17b-16e-instruct",
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
+            await reserve_groq_tokens(messages, max_tokens=1500)
+            chat_completion = await groq_client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
                 max_tokens=1500,
             )
 
@@ -133,52 +184,120 @@ Generate a comprehensive {policy_type.replace("_", " ")} in {language}.
             if not response_text:
                 raise ValueError("Empty response from Groq")
 
-            # 🔹 Extract JSON block with regex
+            # 🔹 Extract JSON block
             json_str = extract_json_block(response_text)
 
-            return json.loads(json_str)
+            policy = orjson.loads(json_str)
+            await POLICY_CACHE.aset(cache_key, policy)
+            return policy
+
+        except (RateLimitError, InternalServerError, APIConnectionError) as e:
+            # Transient; back off with jitter so parallel policy calls don't retry in lockstep
+            print(f"❌ Error generating {policy_type} (attempt {attempt+1}): {e}")
+            if attempt < max_retries:
+                await asyncio.sleep(min(2 ** attempt + random.random(), 30))
+
+        except APIStatusError as e:
+            # Other 4xx errors (bad request, auth) fail the same way on every retry
+            print(f"❌ Error generating {policy_type} (attempt {attempt+1}): {e}")
+            break
 
         except Exception as e:
+            # Empty or malformed output; sample again a little more freely
             print(f"❌ Error generating {policy_type} (attempt {attempt+1}): {e}")
-            if attempt == max_retries:
-                return {
-                    "policy_type": policy_type,
-                    "content": f"⚠️ Failed to generate {policy_type}. Please retry later."
-                }
+            temperature = min(temperature + 0.1, 1.0)
+
+    return {
+        "policy_type": policy_type,
+        "content": f"⚠️ Failed to generate {policy_type}. Please retry later."
+    }
 
 # ---------- Policy Generation Flow ----------
 
-def generate_policies(request: PolicyGenerateRequest) -> Dict:
-    groq_client = Groq(api_key=GROQ_API_KEY)
+async def generate_policies(request: PolicyGenerateRequest, groq_client=None) -> Dict:
+    if groq_client is None:
+        groq_client = AsyncGroq(api_key=GROQ_API_KEY)
 
     compliance_regions = determine_compliance_regions(
         request.business_details.location_country
     )
 
+    # Serialized once and shared by every policy type's prompt and cache key
+    business = request.business_details.model_dump()
+    business_json = orjson.dumps(business).decode()
+
     results = {
-        "business": request.business_details.model_dump(),
+        "business": business,
         "compliance_regions": compliance_regions,
         "strict_compliance": request.strict_compliance,
         "generated_policies": {},
         "timestamp": datetime.now().isoformat(),
-        "api_model": "meta-llama/llama-4-scout-17b-16e-instruct"
+        "api_model": policy_models(request.policy_types)
     }
 
-    for ptype in request.policy_types:
-        policy_json = call_groq_for_policy(
-            request.business_details,
+    # One Groq call per policy type, all in flight at once
+    policies = await asyncio.gather(*(
+        call_groq_for_policy(
+            business_json,
             ptype,
             request.language,
             compliance_regions,
             request.strict_compliance,
             groq_client
         )
+        for ptype in request.policy_types
+    ))
+
+    for ptype, policy_json in zip(request.policy_types, policies):
         if policy_json:
             results["generated_policies"][ptype] = policy_json
 
     return results
 
 
+async def stream_policies(request: PolicyGenerateRequest, groq_client=None):
+    """
+    Yield (policy_type, policy) pairs as soon as each policy is generated.
+
+    Policies arrive in completion order, not in the order they were requested.
+    """
+    if groq_client is None:
+        groq_client = AsyncGroq(api_key=GROQ_API_KEY)
+
+    compliance_regions = determine_compliance_regions(
+        request.business_details.location_country
+    )
+
+    business_json = orjson.dumps(request.business_details.model_dump()).decode()
+
+    async def generate(ptype: str):
+        policy_json = await call_groq_for_policy(
+            business_json,
+            ptype,
+            request.language,
+            compliance_regions,
+            request.strict_compliance,
+            groq_client
+        )
+        return ptype, policy_json
+
+    for next_policy in asyncio.as_completed([generate(ptype) for ptype in request.policy_types]):
+        ptype, policy_json = await next_policy
+        if policy_json:
+            yield ptype, policy_json
+
+
+
+def structure_policies(raw_result: Dict) -> Dict:
+    """
+    Keep only the fields returned to API clients.
+    """
+    return {
+        "generated_policies": raw_result.get("generated_policies", {}),
+        "timestamp": raw_result.get("timestamp", datetime.now().isoformat()),
+        "api_model": raw_result.get("api_model", {})
+    }
+
 
 def main(request: Union[PolicyGenerateRequest, dict], groq_api_key: str) -> str:
     """
@@ -189,15 +308,10 @@ def main(request: Union[PolicyGenerateRequest, dict], groq_api_key: str) -> str:
     if isinstance(request, dict):
         request = PolicyGenerateRequest(**request)
 
-    raw_result = generate_policies(request)
-    structured = {
-        "generated_policies": raw_result.get("generated_policies", {}),
-        "timestamp": raw_result.get("timestamp", datetime.now().isoformat()),
-        "api_model": raw_result.get("api_model", "meta-llama/llama-4-scout-17b-16e-instruct")
-    }
+    structured = structure_policies(asyncio.run(generate_policies(request)))
 
     # 🔹 Structure = return pretty JSON
-    return json.dumps(structured, indent=2, ensure_ascii=False)
+    return orjson.dumps(structured, option=orjson.OPT_INDENT_2).decode()
 
 
 # ---------- Example Run ----------
@@ -0,0 +1,71 @@
+"""
+Tokens-per-minute budget for Groq calls.
+
+Groq rate-limits on tokens per minute, so bursts of concurrent calls
+are paced locally instead of bouncing off 429 responses. The budget is
+enabled only when GROQ_TPM_LIMIT is set.
+
+GROQ_TPM_LIMIT is the account-wide limit. The bucket lives in one
+process, so each worker gets GROQ_TPM_LIMIT / WEB_CONCURRENCY; when
+processes are started some other way, set WEB_CONCURRENCY to their count.
+"""
+
+import asyncio
+import os
+import time
+
+
+class TokenBucket:
+    def __init__(self, tokens_per_minute: int):
+        """Start with a full minute of budget."""
+        self.capacity = tokens_per_minute
+        self.rate = tokens_per_minute / 60
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int):
+        """Wait until `tokens` fit in the budget, then spend them."""
+        # A single call larger than the whole budget would otherwise wait forever
+        tokens = min(tokens, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+def _create_bucket():
+    """Return this worker's share of GROQ_TPM_LIMIT as a TokenBucket, or None if it is unset."""
+    limit = os.getenv("GROQ_TPM_LIMIT")
+    if not limit:
+        return None
+    workers = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    return TokenBucket(max(1, int(limit) // workers))
+
+
+GROQ_TOKEN_BUCKET = _create_bucket()
+
+
+def estimate_tokens(messages: list, max_tokens: int) -> int:
+    """
+    Estimate the tokens a chat completion counts against the limit.
+
+    Args:
+        messages (list): Chat messages sent to the model
+        max_tokens (int): Completion budget requested for the call
+
+    Returns:
+        int: About 4 characters per prompt token, plus the full completion budget
+    """
+    return sum(len(message["content"]) for message in messages) // 4 + max_tokens
+
+
+async def reserve_groq_tokens(messages: list, max_tokens: int):
+    """Wait for room in the process-wide Groq budget before making a call."""
+    if GROQ_TOKEN_BUCKET is not None:
+        await GROQ_TOKEN_BUCKET.acquire(estimate_tokens(messages, max_tokens))
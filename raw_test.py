@@ -1,18 +1,53 @@
+import asyncio
 from typing import Dict, List
-from groq import Groq
+from groq import AsyncGroq
 from datetime import datetime
 from dotenv import load_dotenv
 import os
-import json
+import orjson
+from json_stream import extract_json_span
+from llm_cache import ResponseCache, make_cache_key
+from rate_limit import reserve_groq_tokens
 
 # Load API key
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
+DISCOVERY_CACHE = ResponseCache("procurement-discovery")
+SUPPLIER_CACHE = ResponseCache("procurement-suppliers")
+
+_SUPPLIER_FIELDS = ("title", "link", "snippet")
+_SUPPLIER_DETAIL_FIELDS = ("company_name", "location", "price_range",
+                           "minimum_order", "delivery_time", "contact_method")
+
+
+def is_valid_supplier(supplier) -> bool:
+    """Return True if a supplier entry from the model has every field the API returns."""
+    if not isinstance(supplier, dict):
+        return False
+    details = supplier.get("supplier_details")
+    return (
+        all(isinstance(supplier.get(field), str) for field in _SUPPLIER_FIELDS)
+        and isinstance(details, dict)
+        and all(isinstance(details.get(field), str) for field in _SUPPLIER_DETAIL_FIELDS)
+    )
+
+
+def normalize_material_details(value):
+    """Lowercase and collapse whitespace in every string so near-identical requests share a cache key."""
+    if isinstance(value, str):
+        return " ".join(value.lower().split())
+    if isinstance(value, dict):
+        return {k: normalize_material_details(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [normalize_material_details(v) for v in value]
+    return value
+
 
 class RawMaterialProcurementAnalyzer:
-    def __init__(self, groq_api_key: str):
-        self.groq_client = Groq(api_key=groq_api_key)
+    def __init__(self, groq_api_key: str, groq_client: AsyncGroq = None):
+        # Reuse the caller's client so its connection pool outlives this analyzer
+        self.groq_client = groq_client if groq_client is not None else AsyncGroq(api_key=groq_api_key)
 
         self.known_procurement_platforms = {
             "IndiaMART": "https://www.indiamart.com",
@@ -46,20 +81,27 @@ class RawMaterialProcurementAnalyzer:
             "Leather": ["Raw leather", "Processed leather", "Leather chemicals", "Tanning materials"]
         }
 
-    def discover_suppliers_with_ai(self, material_details: Dict) -> List[str]:
+        self.essential_platforms = ('IndiaMART', 'TradeIndia', 'Amazon Business')
+
+        # Prompts only need the platform names, never the URLs
+        self.platform_names_csv = ", ".join(self.known_procurement_platforms)
+
+    async def discover_suppliers_with_ai(self, material_details: Dict) -> List[str]:
         """Discover procurement platforms using AI with JSON-only response."""
+        cache_key = make_cache_key(normalize_material_details(material_details))
+        cached_platforms = await DISCOVERY_CACHE.aget(cache_key)
+        if cached_platforms is not None:
+            return cached_platforms
+
         prompt = f"""You are a procurement and supply chain expert specializing in raw material sourcing for MSME businesses in India. 
 
 Based on the material requirements provided, recommend the 5-8 most suitable procurement platforms from the list below. 
 
 Material Requirements:
-{json.dumps(material_details, indent=2)}
+{orjson.dumps(material_details).decode()}
 
 Available Platform Options:
-{json.dumps(list(self.known_procurement_platforms.keys()), indent=2)}
-
-Material Categories and Typical Sources:
-{json.dumps(self.material_categories, indent=2)}
+{self.platform_names_csv}
 
 ⚠ IMPORTANT:
 - Return ONLY a JSON array of platform names.
@@ -70,24 +112,28 @@ Material Categories and Typical Sources:
 Example output:
 ["IndiaMART", "TradeIndia", "Amazon Business", "Alibaba India", "Udaan"]
 """
+        messages = [{"role": "user", "content": prompt}]
         try:
-            response = self.groq_client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
+            await reserve_groq_tokens(messages, max_tokens=500)
+            response = await self.groq_client.chat.completions.create(
+                messages=messages,
                 model="llama-3.1-8b-instant",
                 temperature=0.2,
                 max_tokens=500,
             )
             raw_text = response.choices[0].message.content.strip()
-            start = raw_text.find('[')
-            end = raw_text.rfind(']') + 1
-            platforms = json.loads(raw_text[start:end])
-
-            # Filter known platforms and include essential ones
-            platforms = [p for p in platforms if p in self.known_procurement_platforms]
-            for essential in ['IndiaMART', 'TradeIndia', 'Amazon Business']:
-                if essential not in platforms:
-                    platforms.append(essential)
-            return platforms[:8]
+            platforms_json = extract_json_span(raw_text, "[")
+            if platforms_json is None:
+                raise ValueError("No JSON array in platform response")
+            platforms = orjson.loads(platforms_json)
+
+            # Filter known platforms and include essential ones; the dict keeps
+            # the model's order and drops repeats in a single pass
+            selected = dict.fromkeys(p for p in platforms if p in self.known_procurement_platforms)
+            selected.update(dict.fromkeys(self.essential_platforms))
+            platforms = list(selected)[:8]
+            await DISCOVERY_CACHE.aset(cache_key, platforms)
+            return platforms
 
         except Exception:
             # Fallback platforms
@@ -110,13 +156,26 @@ Example output:
             }
         }]
         
-    def get_suppliers_with_ai(self, platform_name: str, material_details: Dict) -> List[Dict]:
+    async def get_suppliers_with_ai(self, platform_name: str, material_details: Dict,
+                                    material_json: str = None) -> List[Dict]:
+        # Callers looking up several platforms pass the details pre-serialized
+        if material_json is None:
+            material_json = orjson.dumps(material_details).decode()
+
+        cache_key = make_cache_key({
+            "platform": platform_name,
+            "material": normalize_material_details(material_details),
+        })
+        cached_suppliers = await SUPPLIER_CACHE.aget(cache_key)
+        if cached_suppliers is not None:
+            return cached_suppliers
+
         prompt = f"""
     You are an expert B2B procurement advisor. 
     Given the following raw material and procurement platform, generate structured supplier information.
 
     Material Details:
-    {json.dumps(material_details, indent=2)}
+    {material_json}
 
     Procurement Platform: {platform_name}
 
@@ -147,19 +206,27 @@ Example output:
     }}
     ]
     """
+        messages = [{"role": "user", "content": prompt}]
         try:
-            response = self.groq_client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
+            await reserve_groq_tokens(messages, max_tokens=800)
+            response = await self.groq_client.chat.completions.create(
+                messages=messages,
                 model="llama-3.1-8b-instant",
                 temperature=0.3,
                 max_tokens=800,
             )
             raw_text = response.choices[0].message.content.strip()
 
-            start = raw_text.find("[")
-            end = raw_text.rfind("]") + 1
-            suppliers = json.loads(raw_text[start:end])
+            suppliers_json = extract_json_span(raw_text, "[")
+            if suppliers_json is None:
+                raise ValueError("No JSON array in supplier response")
+            # Malformed entries are dropped before caching, so a bad reply
+            # can't fail every identical request until the entry expires
+            suppliers = [s for s in orjson.loads(suppliers_json) if is_valid_supplier(s)]
+            if not suppliers:
+                raise ValueError("No complete suppliers in supplier response")
 
+            await SUPPLIER_CACHE.aset(cache_key, suppliers)
             return suppliers
 
         except Exception as e:
@@ -167,15 +234,17 @@ Example output:
             return self.get_fallback_supplier_data(platform_name, material_details)
 
 
-    def analyze_material_procurement(self, material_details: Dict) -> Dict:
+    async def analyze_material_procurement(self, material_details: Dict) -> Dict:
         """Main method to analyze raw material procurement."""
-        platforms = self.discover_suppliers_with_ai(material_details)
+        platforms = await self.discover_suppliers_with_ai(material_details)
 
-        # Get supplier results via Groq for each platform
-        platform_results = {
-            p: self.get_suppliers_with_ai(p, material_details)
-            for p in platforms[:5]
-        }
+        # Get supplier results via Groq for each platform, all in flight at once
+        searched_platforms = platforms[:5]
+        material_json = orjson.dumps(material_details).decode()
+        suppliers = await asyncio.gather(
+            *(self.get_suppliers_with_ai(p, material_details, material_json) for p in searched_platforms)
+        )
+        platform_results = dict(zip(searched_platforms, suppliers))
 
         return {
             "material_details": material_details,
@@ -188,10 +257,10 @@ Example output:
 
 def main(material_data: Dict, groq_api_key: str) -> str:
     if not groq_api_key:
-        return json.dumps({"error": "Groq API key not found"})
+        return orjson.dumps({"error": "Groq API key not found"}).decode()
     analyzer = RawMaterialProcurementAnalyzer(groq_api_key)
-    result = analyzer.analyze_material_procurement(material_data)
-    return json.dumps(result, indent=2, ensure_ascii=False)
+    result = asyncio.run(analyzer.analyze_material_procurement(material_data))
+    return orjson.dumps(result, option=orjson.OPT_INDENT_2).decode()
 
 
 if __name__ == "__main__":
@@ -1,19 +1,33 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from typing import Dict, Any
 from dotenv import load_dotenv
+from groq import AsyncGroq
+from groq_http import shared_async_http_client
+import orjson
 import os
-import json
 
-# Import the main function from raw_test.py
-from raw_test import main as procurement_main
+# Import the analyzer from raw_test.py
+from raw_test import RawMaterialProcurementAnalyzer
 
 # Load environment variables from .env file
 load_dotenv()
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
-app = FastAPI()
+# One client and analyzer per process so connections to the Groq API are reused across requests
+GROQ_CLIENT = AsyncGroq(api_key=GROQ_API_KEY, http_client=shared_async_http_client()) if GROQ_API_KEY else None
+ANALYZER = RawMaterialProcurementAnalyzer(GROQ_API_KEY, groq_client=GROQ_CLIENT) if GROQ_CLIENT else None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    if GROQ_CLIENT is not None:
+        await GROQ_CLIENT.close()
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # Allow CORS for all origins (you can restrict in production)
 app.add_middleware(
@@ -80,48 +94,46 @@ async def analyze_procurement_api(material_data: MaterialData):
     """
     Analyze procurement options for raw materials and fetch suppliers.
     """
-    GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-    if not GROQ_API_KEY:
+    if ANALYZER is None:
         raise HTTPException(status_code=500, detail="GROQ_API_KEY not set in environment.")
 
     try:
-        result_json = procurement_main(material_data.model_dump(), GROQ_API_KEY)
-        result_dict = json.loads(result_json)
-        return result_dict
-    except json.JSONDecodeError as e:
-        raise HTTPException(status_code=500, detail=f"Failed to parse procurement response: {str(e)}")
+        return await ANALYZER.analyze_material_procurement(material_data.model_dump())
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Procurement analysis failed: {str(e)}")
 
-@app.get("/")
-def root():
-    return {
-        "message": "Raw Material Procurement Analysis API. Submit material details to get platform & supplier analysis.",
-        "endpoints": {
-            "analyze_procurement": {
-                "path": "/analyze-procurement",
-                "method": "POST",
-                "description": "Analyze procurement options for raw materials",
-                "request": {
-                    "material_name": "string",
-                    "category": "string",
-                    "specifications": "object (e.g. {grade, quantity_required})",
-                    "budget_range": "object (min_price, max_price, currency, unit)",
-                    "timeline": "object (required_by, flexibility)",
-                    "preferred_location": "string",
-                    "business_type": "string",
-                    "order_frequency": "string",
-                    "payment_preference": "string"
-                },
-                "response": {
-                    "material_details": "object",
-                    "analysis_timestamp": "string",
-                    "discovered_platforms": "list of platforms",
-                    "platform_search_results": "dict of platforms -> suppliers"
-                }
+# The service description never changes, so it is encoded once at import
+_ROOT_BYTES = orjson.dumps({
+    "message": "Raw Material Procurement Analysis API. Submit material details to get platform & supplier analysis.",
+    "endpoints": {
+        "analyze_procurement": {
+            "path": "/analyze-procurement",
+            "method": "POST",
+            "description": "Analyze procurement options for raw materials",
+            "request": {
+                "material_name": "string",
+                "category": "string",
+                "specifications": "object (e.g. {grade, quantity_required})",
+                "budget_range": "object (min_price, max_price, currency, unit)",
+                "timeline": "object (required_by, flexibility)",
+                "preferred_location": "string",
+                "business_type": "string",
+                "order_frequency": "string",
+                "payment_preference": "string"
+            },
+            "response": {
+                "material_details": "object",
+                "analysis_timestamp": "string",
+                "discovered_platforms": "list of platforms",
+                "platform_search_results": "dict of platforms -> suppliers"
             }
         }
     }
+})
+
+@app.get("/")
+async def root():
+    return Response(_ROOT_BYTES, media_type="application/json")
 
 
 
@@ -1,51 +1,159 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from invoice_api_2 import app as invoice_app
-from credit_score_api import app as credit_score_app
-from market_api import app as ecommerce_app
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, Response
+from invoice_api_2 import lifespan as invoice_lifespan, router as invoice_router
+from credit_score_api import lifespan as credit_score_lifespan, router as credit_score_router
+from market_api import lifespan as ecommerce_lifespan, router as ecommerce_router
+from llm_cache import make_cache_key
+import orjson
+import os
+import socket
+import sys
 import uvicorn
 
-main_app = FastAPI(title="Invoice, Credit Score & E-commerce Analyzer API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Included routers don't run their apps' lifespans, so close their Groq clients here
+    async with invoice_lifespan(app), credit_score_lifespan(app), ecommerce_lifespan(app):
+        yield
 
-# Enable CORS
-main_app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"]
+main_app = FastAPI(
+    title="Invoice, Credit Score & E-commerce Analyzer API",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
-# Mount the individual apps
-main_app.mount("/invoice", invoice_app)
-main_app.mount("/credit-score", credit_score_app)
-main_app.mount("/ecommerce", ecommerce_app)
+# Comma-separated allow-list, e.g. "https://app.example.com,https://admin.example.com"
+CORS_ALLOW_ORIGINS = [origin.strip() for origin in os.getenv("CORS_ALLOW_ORIGINS", "").split(",") if origin.strip()]
 
-@main_app.get("/")
-def root():
-    return {
-        "message": "Unified API Gateway",
-        "version": "1.0",
-        "services": {
-            "invoice_extraction": {
-                "description": "Extract detailed invoice information from a single invoice image",
-                "endpoint": "/invoice/extract-invoice",
-                "method": "POST"
-            },
-            "credit_score_analysis": {
-                "description": "Calculate weighted credit score based on financial metrics",
-                "endpoint": "/credit-score/calculate-credit-score",
-                "method": "POST"
-            },
-            "ecommerce_platform_analysis": {
-                "description": "Analyze product and recommend suitable e-commerce platforms",
-                "endpoint": "/ecommerce/analyze-product",
-                "method": "POST"
-            }
+# Behind a reverse proxy that answers preflights and adds the CORS headers itself,
+# skip the middleware so preflight traffic never reaches the event loop
+if os.getenv("CORS_HANDLED_BY_PROXY") != "1":
+    # Enable CORS; without an allow-list any origin may call the API, but without credentials
+    main_app.add_middleware(
+        CORSMiddleware,
+        allow_origins=CORS_ALLOW_ORIGINS or ["*"],
+        allow_credentials=bool(CORS_ALLOW_ORIGINS),
+        allow_methods=["GET", "POST", "OPTIONS"],
+        allow_headers=["*"]
+    )
+
+# Compress JSON bodies of 512 bytes or more; Starlette leaves text/event-stream
+# responses alone, so the streaming endpoints still flush each event as it is sent
+main_app.add_middleware(GZipMiddleware, minimum_size=512, compresslevel=5)
+
+# Include the individual services in one routing table and middleware stack
+main_app.include_router(invoice_router, prefix="/invoice")
+main_app.include_router(credit_score_router, prefix="/credit-score")
+main_app.include_router(ecommerce_router, prefix="/ecommerce")
+
+# The discovery document never changes, so it is encoded once at import
+_ROOT_BYTES = orjson.dumps({
+    "message": "Unified API Gateway",
+    "version": "1.0",
+    "services": {
+        "invoice_extraction": {
+            "description": "Extract detailed invoice information from a single invoice image",
+            "endpoint": "/invoice/extract-invoice",
+            "method": "POST"
+        },
+        "invoice_batch_extraction": {
+            "description": "Extract invoice information from several invoice images concurrently",
+            "endpoint": "/invoice/extract-invoices",
+            "method": "POST"
+        },
+        "credit_score_analysis": {
+            "description": "Calculate weighted credit score based on financial metrics",
+            "endpoint": "/credit-score/calculate-credit-score",
+            "method": "POST"
+        },
+        "ecommerce_platform_analysis": {
+            "description": "Analyze product and recommend suitable e-commerce platforms",
+            "endpoint": "/ecommerce/analyze-product",
+            "method": "POST"
         }
     }
+})
+
+# Changes only on deploy, so clients may reuse it for an hour and then revalidate
+_ROOT_ETAG = f'"{make_cache_key(_ROOT_BYTES)}"'
+_ROOT_HEADERS = {"Cache-Control": "public, max-age=3600", "ETag": _ROOT_ETAG}
+
+@main_app.get("/")
+async def root(request: Request):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or _ROOT_ETAG in if_none_match):
+        return Response(status_code=304, headers=_ROOT_HEADERS)
+    return Response(_ROOT_BYTES, media_type="application/json", headers=_ROOT_HEADERS)
+
+def reuse_port_socket(host: str, port: int) -> socket.socket:
+    """Bind a listening socket that other server processes can also bind with SO_REUSEPORT."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    return sock
 
 if __name__ == "__main__":
-    uvicorn.run("server:main_app", host="127.0.0.1", port=8000, reload=True)
+    # Loopback by default; set HOST=0.0.0.0 in a container or behind a proxy
+    host, port = os.getenv("HOST", "127.0.0.1"), int(os.getenv("PORT", "8000"))
+    server_options = {
+        # uvloop isn't installed on Windows (see requirements.txt)
+        "loop": "asyncio" if sys.platform == "win32" else "uvloop",
+        # C parser instead of h11; per-request access log lines are skipped
+        "http": "httptools",
+        "access_log": False,
+        # Reuse connections across bursts of calls from the same client
+        "timeout_keep_alive": 30,
+        # Answer 503 instead of queueing unbounded work when invoice uploads back up
+        "limit_concurrency": 1000,
+        "backlog": 4096,
+    }
+
+    if os.getenv("SSL_CERTFILE") and os.getenv("SSL_KEYFILE"):
+        # uvicorn only speaks HTTP/1.1; over TLS, Hypercorn lets clients negotiate
+        # HTTP/2 through ALPN and multiplex parallel uploads on one connection
+        from hypercorn.config import Config as HypercornConfig
+        from hypercorn.run import run as hypercorn_run
+
+        config = HypercornConfig()
+        config.application_path = "server:main_app"
+        config.bind = [f"{host}:{port}"]
+        config.certfile = os.environ["SSL_CERTFILE"]
+        config.keyfile = os.environ["SSL_KEYFILE"]
+        config.keep_alive_timeout = server_options["timeout_keep_alive"]
+        config.backlog = server_options["backlog"]
+        config.accesslog = None
+        config.worker_class = "asyncio" if sys.platform == "win32" else "uvloop"
+        config.workers = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+        # Workers inherit this and split per-process budgets such as GROQ_TPM_LIMIT
+        os.environ["WEB_CONCURRENCY"] = str(config.workers)
+        sys.exit(hypercorn_run(config))
+    elif os.getenv("UVICORN_REUSE_PORT") == "1":
+        # Start one copy of this process per core (e.g. from systemd); each has
+        # its own accept queue and the kernel balances connections across them
+        server = uvicorn.Server(uvicorn.Config("server:main_app", **server_options))
+        server.run(sockets=[reuse_port_socket(host, port)])
+    else:
+        # The reloader runs a single process, so it is opt-in for local development
+        reload = os.getenv("UVICORN_RELOAD") == "1"
+        # One event loop per core; WEB_CONCURRENCY overrides, as with the uvicorn CLI
+        workers = 1 if reload else int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+        if workers > 1:
+            # Recycle each worker periodically to cap slow memory growth; only
+            # uvicorn's multi-worker supervisor restarts a worker that exits
+            server_options["limit_max_requests"] = 50_000
+        # Workers inherit this and split per-process budgets such as GROQ_TPM_LIMIT
+        os.environ["WEB_CONCURRENCY"] = str(workers)
+        uvicorn.run(
+            "server:main_app",
+            host=host,
+            port=port,
+            reload=reload,
+            workers=workers,
+            **server_options,
+        )
 
 